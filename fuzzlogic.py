@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Differential fuzzer for the game rules in gamelogic.py.
+
+A faster makeMove(), isBlocked(), BFS(), pushStar(), isLevelFinished() or
+floodFill() has to behave exactly like the ones in gamelogic.py, including
+their odd corners: isWall() is False outside the map while isBlocked() is True
+there, so the player can walk off an open map; negative positions wrap around
+like Python lists do; and so on. This plays random levels with random moves,
+clicks and queries on gamelogic.py (the reference) and on every registered
+engine, and reports the first case where an engine returns something else,
+changes the game state differently or raises a different exception. Failing
+cases are shrunk to a small level and a short list of actions.
+
+An engine is a module that registers the functions it replaces, the others
+are taken from gamelogic.py:
+    import fuzzlogic
+    fuzzlogic.registerEngine('fast', {'BFS': fastBFS, 'pushStar': fastPushStar})
+and is tested with:
+    python3 fuzzlogic.py --engine fastlogic --cases 100000 --jobs 4
+No pygame is needed, so it runs anywhere and fast.
+"""
+
+import argparse, copy, importlib, random, sys, time
+from multiprocessing import Pool
+import gamelogic, levelfile
+
+FUNCTIONS = ('isWall', 'isBlocked', 'makeMove', 'floodFill', 'floorMap', 'BFS', 'pushStar', 'clickTile', 'isLevelFinished')
+REFERENCE = dict((name, getattr(gamelogic, name)) for name in FUNCTIONS)
+ENGINES = {} # engine name -> dict of function name -> function, see registerEngine()
+
+MAX_SIZE = 10 # random levels are up to this wide and high; floodFill() is recursive
+MAX_ACTIONS = 40
+LEVEL_TILES = '#' * 6 + ' ' * 9 + '$$..*' # walls, floor, stars, goals and stars on goals
+DIRECTIONS = (gamelogic.UP, gamelogic.DOWN, gamelogic.LEFT, gamelogic.RIGHT)
+
+def registerEngine(name, functions):
+    """Adds an engine to test. functions maps names from FUNCTIONS to the
+    functions that replace the ones in gamelogic.py."""
+    unknown = set(functions) - set(FUNCTIONS)
+    if unknown: raise ValueError('unknown functions for engine {}: {}'.format(name, ', '.join(sorted(unknown))))
+    engine = dict(REFERENCE)
+    engine.update(functions)
+    ENGINES[name] = engine
+
+def randomCase(rnd):
+    """Returns a random case: tuple (level rows, actions). Levels are random
+    tiles, sometimes walled in and sometimes open to the edge of the map."""
+    width, height = rnd.randint(1, MAX_SIZE), rnd.randint(1, MAX_SIZE)
+    walled = rnd.random() < 0.6
+    rows = []
+    for y in range(height):
+        row = ''
+        for x in range(width):
+            if walled and (x in (0, width - 1) or y in (0, height - 1)): row += '#'
+            else: row += rnd.choice(LEVEL_TILES)
+        rows.append(row.rstrip() if rnd.random() < 0.2 else row) # ragged rows get padded by makeLevelObj()
+    x, y = rnd.randrange(width), rnd.randrange(height)
+    if walled and width > 2 and height > 2: x, y = rnd.randint(1, width - 2), rnd.randint(1, height - 2)
+    rows[y] = rows[y].ljust(x + 1)
+    rows[y] = rows[y][:x] + ('+' if rows[y][x] in '.*' else '@') + rows[y][x + 1:]
+
+    def cell(): # mostly on the map, sometimes just outside of it
+        return rnd.randint(-2, width + 1), rnd.randint(-2, height + 1)
+    actions = []
+    for i in range(rnd.randint(1, MAX_ACTIONS)):
+        kind = rnd.random()
+        if kind < 0.4: actions.append(('makeMove', rnd.choice(DIRECTIONS)))
+        elif kind < 0.7: actions.append(('clickTile', cell()))
+        elif kind < 0.75: actions.append(('isWall', cell()))
+        elif kind < 0.8: actions.append(('isBlocked', cell()))
+        elif kind < 0.87: actions.append(('BFS', cell(), cell()))
+        elif kind < 0.94: actions.append(('pushStar', cell(), cell()))
+        elif kind < 0.97: actions.append(('isLevelFinished',))
+        else: actions.append(('floodFill', cell()))
+    return tuple(rows), tuple(actions)
+
+def outcome(function, *args):
+    """Calls function, returns ('returned', value) or ('raised', exception class name)."""
+    try: return ('returned', function(*args))
+    except Exception as e: return ('raised', type(e).__name__)
+
+def play(engine, rows, actions):
+    """Plays a case on an engine, yielding (action, outcome, game state) after
+    the setup and after each action. Levels without a player yield nothing."""
+    levelObj = levelfile.makeLevelObj(list(rows))
+    gameStateObj = copy.deepcopy(levelObj['startState'])
+    if gameStateObj['player'][0] is None: return
+    setup = outcome(engine['floorMap'], levelObj['mapObj'], gameStateObj['player'])
+    yield ('floorMap',), setup, gameStateObj
+    if setup[0] == 'raised': return
+    mapObj = setup[1]
+    for action in actions:
+        name = action[0]
+        if name == 'makeMove': result = outcome(engine[name], mapObj, gameStateObj, action[1])
+        elif name == 'clickTile': result = outcome(engine[name], mapObj, gameStateObj, action[1])
+        elif name in ('isWall', 'isBlocked'):
+            x, y = action[1]
+            result = outcome(engine['isWall'], mapObj, x, y) if name == 'isWall' else outcome(engine['isBlocked'], mapObj, gameStateObj, x, y)
+        elif name == 'BFS':
+            mesh = copy.deepcopy(mapObj) # like clickTile(): the stars block the way
+            for starx, stary in gameStateObj['stars']: mesh[starx][stary] = '$'
+            result = outcome(engine[name], mesh, action[1], action[2])
+        elif name == 'pushStar': result = outcome(engine[name], mapObj, gameStateObj, action[1], action[2])
+        elif name == 'isLevelFinished': result = outcome(engine[name], levelObj, gameStateObj)
+        elif name == 'floodFill': # on the level as floorMap() gets it, without stars, goals and player
+            mesh = [[' ' if tile in '$.@+*' else tile for tile in column] for column in levelObj['mapObj']]
+            x, y = action[1]
+            result = outcome(engine[name], mesh, x, y, ' ', 'o')
+            if result[0] == 'returned': result = ('returned', mesh)
+        yield action, result, gameStateObj
+
+def findDifference(engine, case):
+    """Returns tuple (action number, action, reference (outcome, state),
+    engine (outcome, state)) for the first action where the engine differs
+    from the reference, or None. Action number 0 is the setup."""
+    rows, actions = case
+    try:
+        reference = play(REFERENCE, rows, actions)
+        other = play(engine, rows, actions)
+        for actionNum, (expected, actual) in enumerate(zip(reference, other)):
+            action, expectedResult, expectedState = expected
+            _, actualResult, actualState = actual
+            if expectedResult != actualResult or expectedState != actualState:
+                return actionNum, action, (expectedResult, expectedState), (actualResult, actualState)
+    except RecursionError: pass # the level is too big for the recursive floodFill(), not a difference
+    return None
+
+def smallerCases(case):
+    """Yields cases that are a bit smaller than case, for shrinking."""
+    rows, actions = case
+    for size in (len(actions) // 2, len(actions) // 4, 1): # leave out runs of actions
+        if size == 0: continue
+        for start in range(0, len(actions), size): yield rows, actions[:start] + actions[start + size:]
+    for y in range(len(rows)): # leave out a row
+        if '@' not in rows[y] and '+' not in rows[y]: yield rows[:y] + rows[y + 1:], actions
+    width = max(len(row) for row in rows)
+    for x in range(width): # leave out a column
+        if not any(row[x:x + 1] in ('@', '+') for row in rows): yield tuple(row[:x] + row[x + 1:] for row in rows), actions
+    for y, row in enumerate(rows): # simpler tiles
+        for x, tile in enumerate(row):
+            for simpler in {'#': ' ', '$': ' ', '.': ' ', '*': '$', '+': '@'}.get(tile, ''):
+                yield rows[:y] + (row[:x] + simpler + row[x + 1:],) + rows[y + 1:], actions
+    for i, action in enumerate(actions): # positions closer to (0, 0)
+        for j, value in enumerate(action):
+            if isinstance(value, tuple) and value != (0, 0):
+                for smaller in ((value[0] // 2, value[1]), (value[0], value[1] // 2)):
+                    if smaller != value: yield rows, actions[:i] + (action[:j] + (smaller,) + action[j + 1:],) + actions[i + 1:]
+
+def shrink(engine, case):
+    """Returns the smallest case found that still makes engine differ from the reference."""
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for smaller in smallerCases(case):
+            if findDifference(engine, smaller) is not None:
+                case = smaller
+                shrunk = True
+                break
+    return case
+
+def fuzzCases(args):
+    """Runs a batch of cases for every engine, returns tuple (number of
+    cases, number of actions, list of (engine name, seed, case) that failed)."""
+    seed, firstCase, count = args
+    failures = []
+    actionCount = 0
+    for caseNum in range(firstCase, firstCase + count):
+        caseSeed = '{}-{}'.format(seed, caseNum)
+        case = randomCase(random.Random(caseSeed))
+        actionCount += len(case[1])
+        for name in sorted(ENGINES):
+            if findDifference(ENGINES[name], case) is not None: failures.append((name, caseSeed, case))
+    return count, actionCount, failures
+
+def describeFailure(name, caseSeed, case):
+    """Returns a report of a shrunk failing case, with the level and the actions to replay it."""
+    actionNum, action, expected, actual = findDifference(ENGINES[name], case)
+    rows, actions = case
+    lines = ['engine {} differs from gamelogic.py (case {}):'.format(name, caseSeed), 'level:']
+    lines.extend('    |{}|'.format(row) for row in rows)
+    lines.append('actions: {!r}'.format(list(actions)))
+    lines.append('after {} ({!r}):'.format('the setup' if actionNum == 0 else 'action {}'.format(actionNum), action))
+    lines.append('    gamelogic.py: {!r}, state {!r}'.format(*expected))
+    lines.append('    {}: {!r}, state {!r}'.format(name, *actual))
+    return '\n'.join(lines)
+
+def initWorker(engineModules):
+    for module in engineModules: importlib.import_module(module)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare other implementations of the game rules with gamelogic.py on random levels.')
+    parser.add_argument('--engine', action='append', default=[], help='module that registers engines, can be given more than once')
+    parser.add_argument('--cases', type=int, default=10000, help='number of random cases')
+    parser.add_argument('--seed', default='1', help='seed, the same seed gives the same cases')
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes, 0 is one per CPU')
+    parser.add_argument('--max-failures', type=int, default=3, help='stop after this many failing cases')
+    args = parser.parse_args()
+
+    sys.path.insert(0, '.')
+    initWorker(args.engine)
+    if not ENGINES: sys.exit('No engines registered, give a module that calls fuzzlogic.registerEngine() with --engine.')
+    batchSize = 200
+    batches = [(args.seed, first, min(batchSize, args.cases - first)) for first in range(0, args.cases, batchSize)]
+    pool = Pool(args.jobs or None, initWorker, (args.engine,)) if args.jobs != 1 else None
+
+    startTime = time.time()
+    caseCount = actionCount = 0
+    failures = []
+    try:
+        for count, actions, batchFailures in (map if pool is None else pool.imap)(fuzzCases, batches):
+            caseCount += count
+            actionCount += actions
+            failures.extend(batchFailures)
+            if len(failures) >= args.max_failures: break
+    finally:
+        if pool is not None: pool.terminate()
+    seconds = max(time.time() - startTime, 1e-9)
+    reported = set()
+    for name, caseSeed, case in failures[:args.max_failures]:
+        case = shrink(ENGINES[name], case)
+        if (name, case) in reported: continue # another case that shrunk to the same repro
+        reported.add((name, case))
+        print(describeFailure(name, caseSeed, case))
+        print()
+    print('{} cases ({} actions) on {} engines in {:.1f}s, {:.0f} cases per second: {} failed'.format(
+        caseCount, actionCount, len(ENGINES), seconds, caseCount / seconds, len(failures)), file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    import fuzzlogic # engines register themselves in this module, not in __main__
+    fuzzlogic.main()
@@ -0,0 +1,332 @@
+"""
+The rules of Star Pusher, without needing pygame.
+
+Moving, pushing stars, the mouse clicks and the flood fill of the map are
+the same for the game in main.py and for the tools that play it without a
+screen (fuzzlogic.py and friends). The map object here is the one the game
+plays on: decorated by floorMap(), with 'o' for the inside floor.
+"""
+
+import collections, copy, heapq, queue
+
+UP = 'up'
+DOWN = 'down'
+LEFT = 'left'
+RIGHT = 'right'
+
+SELECTED_STAR = 'SELECTED_STAR_INDEX' # game state key of the index of the selected star, or None
+
+def isWall(mapObj, x, y):
+    """Returns True if the (x, y) position on
+    the map is a wall, otherwise return False."""
+    if x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
+        return False # x and y aren't actually on the map.
+    elif mapObj[x][y] in ('#', 'x'):
+        return True # wall is blocking
+    return False
+
+
+def isBlocked(mapObj, gameStateObj, x, y):
+    """Returns True if the (x, y) position on the map is
+    blocked by a wall or star, otherwise return False."""
+
+    if isWall(mapObj, x, y):
+        return True
+
+    elif x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
+        return True # x and y aren't actually on the map.
+
+    elif (x, y) in gameStateObj['stars']:
+        return True # a star is blocking
+
+    return False
+
+
+def makeMove(mapObj, gameStateObj, playerMoveTo):
+    """Given a map and game state object, see if it is possible for the
+    player to make the given move. If it is, then change the player's
+    position (and the position of any pushed star). If not, do nothing.
+
+    Returns True if the player moved, otherwise False."""
+
+    # Make sure the player can move in the direction they want.
+    playerx, playery = gameStateObj['player']
+
+    # This variable is "syntactic sugar". Typing "stars" is more
+    # readable than typing "gameStateObj['stars']" in our code.
+    stars = gameStateObj['stars']
+
+    # The code for handling each of the directions is so similar aside
+    # from adding or subtracting 1 to the x/y coordinates. We can
+    # simplify it by using the xOffset and yOffset variables.
+    if playerMoveTo == UP:
+        xOffset = 0
+        yOffset = -1
+    elif playerMoveTo == RIGHT:
+        xOffset = 1
+        yOffset = 0
+    elif playerMoveTo == DOWN:
+        xOffset = 0
+        yOffset = 1
+    elif playerMoveTo == LEFT:
+        xOffset = -1
+        yOffset = 0
+
+    # See if the player can move in that direction.
+    if isWall(mapObj, playerx + xOffset, playery + yOffset):
+        return False
+    else:
+        if (playerx + xOffset, playery + yOffset) in stars:
+            # There is a star in the way, see if the player can push it.
+            if not isBlocked(mapObj, gameStateObj, playerx + (xOffset*2), playery + (yOffset*2)):
+                # Move the star.
+                ind = stars.index((playerx + xOffset, playery + yOffset))
+                stars[ind] = (stars[ind][0] + xOffset, stars[ind][1] + yOffset)
+            else:
+                return False
+        # Move the player upwards.
+        gameStateObj['player'] = (playerx + xOffset, playery + yOffset)
+        return True
+
+
+def floodFill(mapObj, x, y, oldCharacter, newCharacter):
+    """Changes any values matching oldCharacter on the map object to
+    newCharacter at the (x, y) position, and does the same for the
+    positions to the left, right, down, and up of (x, y), recursively."""
+
+    # In this game, the flood fill algorithm creates the inside/outside
+    # floor distinction. This is a "recursive" function.
+    # For more info on the Flood Fill algorithm, see:
+    #   http://en.wikipedia.org/wiki/Flood_fill
+    if mapObj[x][y] == oldCharacter:
+        mapObj[x][y] = newCharacter
+
+    if x < len(mapObj) - 1 and mapObj[x+1][y] == oldCharacter:
+        floodFill(mapObj, x+1, y, oldCharacter, newCharacter) # call right
+    if x > 0 and mapObj[x-1][y] == oldCharacter:
+        floodFill(mapObj, x-1, y, oldCharacter, newCharacter) # call left
+    if y < len(mapObj[x]) - 1 and mapObj[x][y+1] == oldCharacter:
+        floodFill(mapObj, x, y+1, oldCharacter, newCharacter) # call down
+    if y > 0 and mapObj[x][y-1] == oldCharacter:
+        floodFill(mapObj, x, y-1, oldCharacter, newCharacter) # call up
+
+
+def floorMap(mapObj, startxy):
+    """Makes a copy of the given map object with the stars, goals and player
+    removed, the inside floor turned into 'o' tiles and the walls that are
+    corners turned into 'x' corner pieces. decorateMap() in main.py adds the
+    trees and rocks to this."""
+
+    startx, starty = startxy # Syntactic sugar
+
+    # Copy the map object so we don't modify the original passed
+    mapObjCopy = copy.deepcopy(mapObj)
+
+    # Remove the non-wall characters from the map data
+    for x in range(len(mapObjCopy)):
+        for y in range(len(mapObjCopy[0])):
+            if mapObjCopy[x][y] in ('$', '.', '@', '+', '*'):
+                mapObjCopy[x][y] = ' '
+
+    # Flood fill to determine inside/outside floor tiles.
+    floodFill(mapObjCopy, startx, starty, ' ', 'o')
+
+    # Convert the adjoined walls into corner tiles.
+    for x in range(len(mapObjCopy)):
+        for y in range(len(mapObjCopy[0])):
+            if mapObjCopy[x][y] == '#':
+                if (isWall(mapObjCopy, x, y-1) and isWall(mapObjCopy, x+1, y)) or \
+                   (isWall(mapObjCopy, x+1, y) and isWall(mapObjCopy, x, y+1)) or \
+                   (isWall(mapObjCopy, x, y+1) and isWall(mapObjCopy, x-1, y)) or \
+                   (isWall(mapObjCopy, x-1, y) and isWall(mapObjCopy, x, y-1)):
+                    mapObjCopy[x][y] = 'x'
+
+    return mapObjCopy
+
+
+def BFS(mesh, src, dest):
+    """Breadth First Search, function to find the shortest path between a given source cell to a destination cell. https://www.geeksforgeeks.org/shortest-path-in-a-binary-maze/"""
+    src_x, src_y = src
+    dest_x, dest_y = dest
+    if mesh[src_x][src_y] != 'o' or mesh[dest_x][dest_y] != 'o': return None
+    visited = set() # keep track of visited cells
+    visited.add(src) # Mark the source cell as visited
+    q = queue.Queue() # list to hold the calculated distance for each point to dest
+    q.put((src, 0)) # 0 steps to reach src
+    while not q.empty(): # Do a BFS starting from source cell
+        (point_x, point_y), distance = q.get()
+        # If we have reached the destination cell, we are done..
+        if point_x == dest_x and point_y == dest_y: return distance
+        # Check current cell and add neighboring cells to the queue
+        rowNum = [-1, 0, 0, 1]
+        colNum = [0, -1, 1, 0]
+        for i in range(4):
+            row = point_x + rowNum[i]
+            col = point_y + colNum[i]
+            if row >= 0 and row < len(mesh) and col >= 0 and col < len(mesh[0]) and mesh[row][col] == 'o' and not (row, col) in visited:
+                # mark cell as visited and enqueue it
+                visited.add((row, col))
+                q.put(((row, col), distance + 1))
+    return None # destination cannot be reached
+
+
+def pushStar(mapObj, gameStateObj, src, dest):
+    """returns tuple (stepCount, player position) if star can be pushed to destination, otherwise returns None"""
+    src_x, src_y = src
+    mesh = copy.deepcopy(mapObj)
+    for star_x, star_y in gameStateObj['stars']:
+        if not (star_x == src_x and star_y == src_y): mesh[star_x][star_y] = "$" # draw all stars accept the selected one
+    if dest == None: # see already if src adjoining cell can be reached by player
+        return None
+    dest_x, dest_y = dest
+    if mesh[dest_x][dest_y] != 'o': return None # inside floor
+    visited = set() # keep track of visited cells
+    visited.add(src) # Mark the source cell as visited
+    q = queue.Queue() # list to hold for each point: point currently holding the selected star, stepCount, player position
+    q.put((src, 0, gameStateObj['player'])) # 0 steps to reach src
+    while not q.empty(): # Do a BFS starting from source cell
+        (point_x, point_y), distance, (player_x, player_y) = q.get()
+        # If we have reached the destination cell, we are done..
+        if point_x == dest_x and point_y == dest_y: return (distance, (player_x, player_y))
+        # Check current cell and add neighboring cells to the queue
+        rowNum = [-1, 0, 0, 1]
+        colNum = [0, -1, 1, 0]
+        for i in range(4):
+            row = point_x + rowNum[i]
+            col = point_y + colNum[i]
+            opposite_x = point_x - rowNum[i]
+            opposite_y = point_y - colNum[i]
+            if row >= 0 and row < len(mesh) and col >= 0 and col < len(mesh[0]) and mesh[row][col] == 'o' and not (row, col) in visited:
+                # check if player can walk to opposite point to push it here
+                mesh2 = copy.deepcopy(mesh)
+                mesh2[point_x][point_y] = "$" # draw selected star in it's current position
+                playerSteps = BFS(mesh2, (player_x, player_y), (opposite_x, opposite_y))
+                if playerSteps != None:
+                    # mark cell as visited and enqueue it
+                    visited.add((row, col))
+                    q.put(((row, col), distance + playerSteps + 1, (point_x, point_y)))
+    return None # destination cannot be reached
+
+
+def walkDistances(mesh, src):
+    """Returns a dict with the number of steps from src to every 'o' position
+    the player can walk to, the same as BFS() gives for each of them. Empty
+    if src is off the map (the player can walk off a map that isn't walled in)."""
+    src_x, src_y = src
+    if not (0 <= src_x < len(mesh) and 0 <= src_y < len(mesh[0])) or mesh[src_x][src_y] != 'o': return {}
+    distances = {src: 0}
+    q = collections.deque([src])
+    while q:
+        point_x, point_y = q.popleft()
+        for row, col in ((point_x - 1, point_y), (point_x, point_y - 1), (point_x, point_y + 1), (point_x + 1, point_y)):
+            if row >= 0 and row < len(mesh) and col >= 0 and col < len(mesh[0]) and mesh[row][col] == 'o' and not (row, col) in distances:
+                distances[(row, col)] = distances[(point_x, point_y)] + 1
+                q.append((row, col))
+    return distances
+
+def pushField(mapObj, gameStateObj, src):
+    """Returns a dict with, for every position the star at src can be pushed
+    to, tuple (stepCount, player position): the fewest steps (walking and
+    pushing) to get it there, and where the player stands then. Positions it
+    can't be pushed to are left out. Unlike pushStar(), which stops at the
+    first way it finds, this is the minimum, and it never raises IndexError
+    on levels whose floor reaches the map's edge."""
+    src_x, src_y = src
+    mesh = copy.deepcopy(mapObj)
+    for star_x, star_y in gameStateObj['stars']:
+        if not (star_x == src_x and star_y == src_y): mesh[star_x][star_y] = "$" # draw all stars accept the selected one
+    field = {}
+    if mesh[src_x][src_y] == 'o': field[src] = (0, gameStateObj['player'])
+    # Dijkstra over (star position, player position) states. After a push the
+    # player stands next to the star, so there are at most 4 per position.
+    done = set()
+    q = [(0, src, gameStateObj['player'])]
+    while q:
+        distance, (point_x, point_y), player = heapq.heappop(q)
+        if ((point_x, point_y), player) in done: continue
+        done.add(((point_x, point_y), player))
+        if (point_x, point_y) not in field: field[(point_x, point_y)] = (distance, player)
+        # Where can the player walk with the selected star in its current position?
+        tile = mesh[point_x][point_y]
+        mesh[point_x][point_y] = "$"
+        walk = walkDistances(mesh, player)
+        mesh[point_x][point_y] = tile
+        for row, col in ((point_x - 1, point_y), (point_x, point_y - 1), (point_x, point_y + 1), (point_x + 1, point_y)):
+            if row >= 0 and row < len(mesh) and col >= 0 and col < len(mesh[0]) and mesh[row][col] == 'o' \
+                and not ((row, col), (point_x, point_y)) in done:
+                # the player pushes from the opposite side
+                playerSteps = walk.get((2 * point_x - row, 2 * point_y - col))
+                if playerSteps != None: heapq.heappush(q, (distance + playerSteps + 1, (row, col), (point_x, point_y)))
+    return field
+
+class PushFieldCache:
+    """Keeps the pushField() of the selected star of one map, until the game state changes."""
+    def __init__(self):
+        self.key = None
+        self.field = {}
+
+    def get(self, mapObj, gameStateObj):
+        """Returns pushField() for the selected star, an empty dict if no star is selected."""
+        selected = gameStateObj[SELECTED_STAR]
+        key = (gameStateObj['player'], tuple(gameStateObj['stars']), selected)
+        if key != self.key:
+            self.key = key
+            self.field = {} if selected == None else pushField(mapObj, gameStateObj, gameStateObj['stars'][selected])
+        return self.field
+
+def clickTile(mapObj, gameStateObj, mouseTile, pushFields=None):
+    """Handles a mouse click on the (x, y) tile mouseTile, like the game does:
+        * on a star the player can walk to: select it, or unselect it if it was selected,
+        * on the floor with a star selected: push that star there,
+        * on the floor without a star selected: walk there,
+        * on a wall: unselect the star.
+    Returns the number of steps made, None if the steps shown for the
+    previous move should stay (clicks that didn't walk or push). With a
+    PushFieldCache as pushFields, pushes are looked up in its pushField()
+    instead of searched by pushStar()."""
+    mouseTileX, mouseTileY = mouseTile
+    if not isBlocked(mapObj, gameStateObj, mouseTileX, mouseTileY):
+        if gameStateObj[SELECTED_STAR] != None: # push star
+            selectedStar = gameStateObj['stars'][gameStateObj[SELECTED_STAR]]
+            if pushFields != None: distance, player = pushFields.get(mapObj, gameStateObj).get(mouseTile, (None, None))
+            else: distance, player = pushStar(mapObj, gameStateObj, selectedStar, mouseTile) or (None, None)
+            if distance != None and distance > 0:
+                gameStateObj['stepCounter'] += distance
+                gameStateObj['player'] = player
+                # Move the star.
+                gameStateObj['stars'][gameStateObj[SELECTED_STAR]] = mouseTile
+                return distance
+        else: # teleport
+            # Create mesh, draw current location of stars:
+            mesh = copy.deepcopy(mapObj)
+            for star_x, star_y in gameStateObj['stars']: mesh[star_x][star_y] = "$"
+            distance = BFS(mesh, gameStateObj['player'], mouseTile)
+            if not distance == None and distance > 0:
+                gameStateObj['stepCounter'] += distance
+                gameStateObj['player'] = mouseTile
+                return distance
+            return 0
+    elif mouseTile in gameStateObj['stars']:
+        # select or unselect star
+        mouseTileStarIndex = gameStateObj['stars'].index(mouseTile)
+        if mouseTileStarIndex == gameStateObj[SELECTED_STAR]:
+            gameStateObj[SELECTED_STAR] = None
+        else:
+            # see if player could walk to it
+            mesh = copy.deepcopy(mapObj)
+            for star_x, star_y in gameStateObj['stars']: 
+                if not (star_x == mouseTileX and star_y == mouseTileY): mesh[star_x][star_y] = "$"
+            distance = BFS(mesh, gameStateObj['player'], mouseTile)
+            if not distance == None:
+                gameStateObj[SELECTED_STAR] = mouseTileStarIndex
+    else: # click on wall
+        if gameStateObj[SELECTED_STAR] != None:
+            gameStateObj[SELECTED_STAR] = None
+    return None
+
+
+def isLevelFinished(levelObj, gameStateObj):
+    """Returns True if all the goals have stars in them."""
+    for goal in levelObj['goals']:
+        if goal not in gameStateObj['stars']: return False # Found a space with a goal but no star on it.
+    return True
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Star Pusher game server, for playing many games at once behind a web or
+terminal front-end (tournaments, classrooms).
+
+Every connection is a session with its own game state, undo and redo. The
+levels are loaded once and shared read-only by all sessions, the rules are
+the ones in gamelogic.py. Commands and answers are JSON, one object per line:
+    {"cmd": "level", "level": 0}             start (or restart) a level
+    {"cmd": "move", "dir": "up", "repeat": 1} up, down, left or right
+    {"cmd": "click", "x": 5, "y": 4}          like a mouse click on that tile
+    {"cmd": "undo"} and {"cmd": "redo"}
+An "id" in a command is sent back in its answer. Answers only hold what
+changed: {"id": 1, "diff": {"player": [6, 4], "stars": {"4": [6, 4]}}, "steps": 1}
+("stars" maps the index of each star that moved to its new position), plus
+"solved": true once all goals are covered. Starting a level answers with the
+level's rows and the whole state. Errors are answered with {"error": "..."}.
+
+A click on a star, or a click while a star is selected, searches where the
+star can be pushed to. On big levels that takes long, so clicks are run in a
+pool of CLICK_THREADS threads, not on the event loop: the other sessions keep
+getting answers, but as the threads share one CPU (Python's GIL) they get
+slower while big clicks are running.
+
+    python3 gameserver.py --unix /tmp/starpusher.sock
+    python3 gameserver.py --port 8765
+loadtest.py plays many sessions against it to measure its speed.
+"""
+
+import argparse, asyncio, concurrent.futures, copy, json, os, signal, sys
+import gamelogic, levelfile, sysresources
+
+MAX_UNDO = 300 # states kept for undo per session, like the game
+MAX_REPEAT = 100 # most steps one move command can make, like SHIFT in the game
+DIRECTIONS = (gamelogic.UP, gamelogic.DOWN, gamelogic.LEFT, gamelogic.RIGHT)
+CLICK_THREADS = 4 # clicks run in these threads, see above
+
+class CommandError(Exception):
+    """A command that can't be done, answered with {"error": ...}."""
+
+def intArgument(command, name, default=None):
+    """Returns command[name] as an int. Raises CommandError if it is missing
+    (without a default) or not a number, like 1e400 which JSON reads as infinity."""
+    try: return int(command.get(name, default))
+    except (TypeError, ValueError, OverflowError): raise CommandError('{} must be a number'.format(name))
+
+def loadLevels(filename):
+    """Returns the list of level objects in a level file, each with the map
+    the rules play on ('floorMap') and the level's rows ('rows') added. They
+    are shared by all sessions and never changed. Levels the game can't play
+    are left out: without a player, or not walled in (the rules would walk
+    off the map)."""
+    levels = []
+    with open(filename, 'r') as mapFile:
+        for lineNum, rows in levelfile.iterLevelRows(mapFile):
+            levelObj = levelfile.makeLevelObj(rows)
+            if levelObj['startState']['player'][0] is None: continue # readLevelsFile() refuses these
+            if not levelfile.isWalledIn(levelObj): continue # levelcheck.py reports these
+            levelObj['floorMap'] = gamelogic.floorMap(levelObj['mapObj'], levelObj['startState']['player'])
+            levelObj['rows'] = rows
+            levels.append(levelObj)
+    return levels
+
+def stateDiff(old, new):
+    """Returns the parts of game state new that differ from old, as JSON-able
+    values. Stars are given as {index: position} for the stars that moved."""
+    diff = {}
+    for key, value in new.items():
+        if key == 'stars':
+            oldStars = old.get('stars', [])
+            moved = dict((str(i), star) for i, star in enumerate(value) if i >= len(oldStars) or oldStars[i] != star)
+            if moved: diff['stars'] = moved
+        elif key not in old or old[key] != value: diff[key] = value
+    return diff
+
+class Session:
+    """One player's game: the level being played, its state and the undo and redo lists."""
+    def __init__(self, levels):
+        self.levels = levels
+        self.levelObj = None
+        self.gameStateObj = None
+        self.history = [] # earlier states, for undo
+        self.redoList = []
+        self.pushFields = gamelogic.PushFieldCache() # where the selected star can be pushed to
+
+    def handle(self, command):
+        """Runs one command (a dict) and returns the answer (a dict)."""
+        cmd = command.get('cmd')
+        if cmd == 'level': return self.startLevel(command.get('level', 0))
+        if self.levelObj is None: raise CommandError('start a level first')
+        before = copy.deepcopy(self.gameStateObj)
+        steps = None
+        if cmd == 'move':
+            if command.get('dir') not in DIRECTIONS: raise CommandError('dir must be one of {}'.format(', '.join(DIRECTIONS)))
+            steps = 0
+            for i in range(max(1, min(intArgument(command, 'repeat', 1), MAX_REPEAT))):
+                if not gamelogic.makeMove(self.levelObj['floorMap'], self.gameStateObj, command['dir']): break
+                self.gameStateObj['stepCounter'] += 1
+                steps += 1
+        elif cmd == 'click':
+            steps = gamelogic.clickTile(self.levelObj['floorMap'], self.gameStateObj, (intArgument(command, 'x'), intArgument(command, 'y')), self.pushFields)
+        elif cmd == 'undo':
+            if self.history:
+                self.redoList.append(self.gameStateObj)
+                self.gameStateObj = self.history.pop()
+        elif cmd == 'redo':
+            if self.redoList:
+                self.history.append(self.gameStateObj)
+                self.gameStateObj = self.redoList.pop()
+        else: raise CommandError('unknown command {!r}'.format(cmd))
+        if cmd in ('move', 'click') and self.gameStateObj != before:
+            self.history.append(before)
+            if len(self.history) > MAX_UNDO: self.history.pop(0)
+            self.redoList = []
+        answer = {'diff': stateDiff(before, self.gameStateObj)}
+        if steps != None: answer['steps'] = steps
+        if gamelogic.isLevelFinished(self.levelObj, self.gameStateObj): answer['solved'] = True
+        return answer
+
+    def startLevel(self, levelNum):
+        if not isinstance(levelNum, int) or isinstance(levelNum, bool) or not 0 <= levelNum < len(self.levels):
+            raise CommandError('level must be a number from 0 to {}'.format(len(self.levels) - 1))
+        self.levelObj = self.levels[levelNum]
+        self.gameStateObj = copy.deepcopy(self.levelObj['startState'])
+        self.history = []
+        self.redoList = []
+        self.pushFields = gamelogic.PushFieldCache() # it is for one map
+        return {'level': levelNum, 'rows': self.levelObj['rows'], 'goals': self.levelObj['goals'],
+                'diff': stateDiff({}, self.gameStateObj)}
+
+class GameServer:
+    """Serves a Session per connection. sessions counts the open ones."""
+    def __init__(self, levels):
+        self.levels = levels
+        self.sessions = 0
+        self.clickPool = concurrent.futures.ThreadPoolExecutor(CLICK_THREADS)
+
+    async def serve(self, reader, writer):
+        session = Session(self.levels)
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break # the client closed the connection
+                answer = {}
+                try:
+                    command = json.loads(line.decode('utf-8'))
+                    if not isinstance(command, dict): raise CommandError('a command must be a JSON object')
+                    if 'id' in command: answer['id'] = command['id']
+                    if command.get('cmd') == 'click': # can take long, see above
+                        answer.update(await asyncio.get_event_loop().run_in_executor(self.clickPool, session.handle, command))
+                    else: answer.update(session.handle(command))
+                except Exception as e: # also a bug in the rules, the session goes on
+                    answer['error'] = str(e) if isinstance(e, CommandError) else '{}: {}'.format(type(e).__name__, e)
+                writer.write(json.dumps(answer, separators=(',', ':')).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError): pass # ValueError: line too long
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Star Pusher games over a socket, JSON lines.')
+    parser.add_argument('--levels', default='starPusherLevels.txt', help='level file')
+    parser.add_argument('--unix', help='listen on this Unix socket path')
+    parser.add_argument('--host', default='127.0.0.1', help='listen on this address (default %(default)s)')
+    parser.add_argument('--port', type=int, default=8765, help='listen on this TCP port (default %(default)s)')
+    args = parser.parse_args()
+
+    sysresources.raiseFileLimit()
+    server = GameServer(loadLevels(args.levels))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    if args.unix:
+        if os.path.exists(args.unix): os.unlink(args.unix) # left over from an earlier run
+        listener = loop.run_until_complete(asyncio.start_unix_server(server.serve, path=args.unix, backlog=4096))
+        where = args.unix
+    else:
+        listener = loop.run_until_complete(asyncio.start_server(server.serve, args.host, args.port, backlog=4096))
+        where = '{}:{}'.format(args.host, args.port)
+    print('Serving {} levels on {}'.format(len(server.levels), where), file=sys.stderr)
+    try: loop.add_signal_handler(signal.SIGTERM, loop.stop) # clean up on kill too
+    except NotImplementedError: pass # Windows
+    try: loop.run_forever()
+    except KeyboardInterrupt: pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        loop.close()
+        server.clickPool.shutdown(wait=False)
+        if args.unix and os.path.exists(args.unix): os.unlink(args.unix)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Level file validator for Star Pusher.
+
+readLevelsFile() stops at the first bad level and only checks the player,
+goals and stars are there. This checks every level of every file in one pass
+and reports all problems with their line numbers:
+    python3 levelcheck.py [--jobs 4] starPusherLevels.txt [more.txt ...]
+
+Errors make a level unplayable or unsolvable, warnings are worth a look.
+Duplicates are found by a hash of the level that is the same for every
+rotation, mirror image and padding of it (see levelfile.canonicalLevel()).
+The exit status is 1 if there were errors.
+"""
+
+import argparse, sys, time
+from multiprocessing import Pool
+import levelfile, solver
+
+LEVEL_CHARACTERS = set('#@+$*. ')
+
+def checkLevel(levelObj, firstLineNum):
+    """Returns tuple (problems, level hash). problems is a list of
+    (lineNum, 'error' or 'warning', message), the hash is None if there are errors."""
+    problems = []
+    mapObj = levelObj['mapObj']
+    player = levelObj['startState']['player']
+    goals = levelObj['goals']
+    stars = levelObj['startState']['stars']
+
+    def where(cell): # line number and column of a position, for the messages
+        return firstLineNum + cell[1], 'column {}'.format(cell[0] + 1)
+
+    players = []
+    for x in range(len(mapObj)):
+        for y in range(len(mapObj[x])):
+            if mapObj[x][y] in ('@', '+'): players.append((x, y))
+            elif mapObj[x][y] not in LEVEL_CHARACTERS:
+                lineNum, column = where((x, y))
+                problems.append((lineNum, 'error', 'unknown character {!r} at {}'.format(mapObj[x][y], column)))
+    if len(players) > 1:
+        problems.append((where(players[0])[0], 'error', 'has {} players, the last one is used'.format(len(players))))
+    if len(goals) == 0: problems.append((firstLineNum, 'error', 'has no goals'))
+    if len(stars) < len(goals):
+        problems.append((firstLineNum, 'error', 'has {} goals but only {} stars'.format(len(goals), len(stars))))
+    if player[0] is None:
+        problems.append((firstLineNum, 'error', 'is missing a "@" or "+" to mark the start point'))
+        return problems, None # everything below starts from the player
+
+    floor = solver.insideFloor(mapObj, player)
+    if not levelfile.isWalledIn(levelObj, floor):
+        problems.append((where(player)[0], 'error', 'player is not walled in, the floor leaks into the outside'))
+    distances = solver.goalDistances(floor, goals)
+    deadStars = [star for star in stars if star in floor and star not in distances]
+    # With more stars than goals some stars may stay where they are.
+    deadKind = 'error' if len(stars) - len(deadStars) < len(goals) else 'warning'
+    for star in stars:
+        if star in goals: continue
+        lineNum, column = where(star)
+        if star not in floor:
+            problems.append((lineNum, 'error', 'star at {} can\'t be reached'.format(column)))
+        elif star in deadStars:
+            problems.append((lineNum, deadKind, 'star at {} is on a dead square, it can never reach a goal'.format(column)))
+    for goal in goals:
+        if goal not in floor and goal not in stars:
+            lineNum, column = where(goal)
+            problems.append((lineNum, 'error', 'goal at {} can\'t be reached'.format(column)))
+    if any(kind == 'error' for _, kind, _ in problems): return problems, None
+    return problems, levelfile.levelHash(levelObj, floor)
+
+def checkRows(level):
+    """checkLevel() for a (lineNum, rows) tuple of levelfile.iterLevelRows(),
+    returns tuple (first line number, problems, level hash)."""
+    lineNum, rows = level
+    firstLineNum = lineNum - len(rows) + 1
+    return (firstLineNum,) + checkLevel(levelfile.makeLevelObj(rows), firstLineNum)
+
+def checkFile(filename, seen, pool=None, out=sys.stdout):
+    """Checks every level in a level file and prints the problems. seen maps
+    level hashes to where they were seen first, to report duplicates across
+    files. The levels are checked by the processes of pool, if given.
+    Returns tuple (number of levels, number of errors, number of warnings)."""
+    levelCount = errorCount = warningCount = 0
+    with open(filename, 'r') as mapFile:
+        levels = levelfile.iterLevelRows(mapFile)
+        results = map(checkRows, levels) if pool is None else pool.imap(checkRows, levels, chunksize=64)
+        for levelNum, (firstLineNum, problems, key) in enumerate(results, 1):
+            levelCount += 1
+            if key is not None:
+                if key in seen:
+                    problems.append((firstLineNum, 'warning', 'is a duplicate of level {} (line {}) in {}'.format(*seen[key])))
+                else: seen[key] = (levelNum, firstLineNum, filename)
+            for problemLineNum, kind, message in sorted(problems):
+                out.write('{}:{}: {}: level {} {}\n'.format(filename, problemLineNum, kind, levelNum, message))
+                if kind == 'error': errorCount += 1
+                else: warningCount += 1
+    return levelCount, errorCount, warningCount
+
+def main():
+    parser = argparse.ArgumentParser(description='Check Star Pusher level files.')
+    parser.add_argument('files', nargs='+', help='level files to check')
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes, 0 is one per CPU')
+    args = parser.parse_args()
+
+    pool = Pool(args.jobs or None) if args.jobs != 1 else None
+
+    seen = {} # level hash -> (level number, line number, file name)
+    totals = [0, 0, 0]
+    startTime = time.time()
+    for filename in args.files:
+        try:
+            for i, count in enumerate(checkFile(filename, seen, pool)): totals[i] += count
+        except (IOError, UnicodeDecodeError) as e:
+            print('{}: error: {}'.format(filename, str(e)))
+            totals[1] += 1
+    print('{} levels checked in {:.1f}s: {} errors, {} warnings'.format(totals[0], time.time() - startTime, totals[1], totals[2]), file=sys.stderr)
+    sys.exit(1 if totals[1] > 0 else 0)
+
+if __name__ == '__main__': main()
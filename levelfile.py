@@ -0,0 +1,141 @@
+"""
+Reading the Star Pusher level file, without needing pygame.
+
+The format is described at the top of starPusherLevels.txt: one character per
+tile, everything after a ; is a comment and levels are separated by a blank
+line. readLevelsFile() in main.py and the tools (levelcheck.py and friends)
+all read levels through the functions in this file.
+"""
+
+import hashlib
+import gamelogic, solver
+
+def iterLevelRows(lines):
+    """Reads the lines of a level file one by one and yields tuple
+    (lineNum, rows) for every level, without keeping the whole file in memory.
+    lineNum is the number of the last line of the level, rows the level's map
+    lines without comments."""
+    rows = []
+    lineNum = 0
+    for lineNum, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if ';' in line:
+            # Ignore the ; lines, they're comments in the level file.
+            line = line[:line.find(';')]
+        if line != '':
+            rows.append(line) # This line is part of the map.
+        elif len(rows) > 0:
+            # A blank line indicates the end of a level's map in the file.
+            yield lineNum - 1, rows
+            rows = []
+    if len(rows) > 0: yield lineNum, rows # the last level doesn't need a blank line
+
+def makeLevelObj(rows):
+    """Converts the map lines of a level into a level object. Nothing is
+    checked: the player position is (None, None) if the level has no "@" or "+"."""
+    # Add spaces to the ends of the shorter rows. This
+    # ensures the map will be rectangular.
+    maxWidth = max(len(row) for row in rows)
+    rows = [row + ' ' * (maxWidth - len(row)) for row in rows]
+
+    # Convert the rows to a map object, a list of columns.
+    mapObj = [[row[x] for row in rows] for x in range(maxWidth)]
+
+    # Loop through the spaces in the map and find the @, ., and $
+    # characters for the starting game state.
+    startx = None # The x and y for the player's starting position
+    starty = None
+    goals = [] # list of (x, y) tuples for each goal.
+    stars = [] # list of (x, y) for each star's starting position.
+    for x in range(maxWidth):
+        for y in range(len(mapObj[x])):
+            if mapObj[x][y] in ('@', '+'):
+                # '@' is player, '+' is player & goal
+                startx = x
+                starty = y
+            if mapObj[x][y] in ('.', '+', '*'):
+                # '.' is goal, '*' is star & goal
+                goals.append((x, y))
+            if mapObj[x][y] in ('$', '*'):
+                # '$' is star
+                stars.append((x, y))
+
+    # Create level object and starting game state object.
+    gameStateObj = {'player': (startx, starty),
+                    'stepCounter': 0,
+                    'stars': stars, gamelogic.SELECTED_STAR: None}
+    return {'width': maxWidth,
+            'height': len(mapObj),
+            'mapObj': mapObj,
+            'goals': goals,
+            'startState': gameStateObj}
+
+def isWalledIn(levelObj, floor=None):
+    """Returns False if the floor the player can walk on reaches the edge of
+    the map: the map is padded with spaces, so it leaks into the outside.
+    floor is solver.insideFloor() of the level, if the caller already has it."""
+    mapObj = levelObj['mapObj']
+    if floor is None: floor = solver.insideFloor(mapObj, levelObj['startState']['player'])
+    return not any(x == 0 or y == 0 or x == len(mapObj) - 1 or y == len(mapObj[0]) - 1 for x, y in floor)
+
+def canonicalLevel(levelObj, floor=None):
+    """Returns the level as a string that is the same for every rotation,
+    mirror image and padding of the same puzzle. Walls that don't touch the
+    inside of the level are left out, and the player is replaced by the area
+    the player can walk to, so the exact start position doesn't matter.
+    floor is solver.insideFloor() of the level, if the caller already has it."""
+    mapObj = levelObj['mapObj']
+    width, height = len(mapObj), len(mapObj[0])
+    player = levelObj['startState']['player']
+    goals = set(levelObj['goals'])
+    stars = set(levelObj['startState']['stars'])
+    if floor is None: floor = solver.insideFloor(mapObj, player)
+    inside = floor | goals | stars
+    reach = solver.playerReach(inside, stars, player)[0]
+    walls = set()
+    for x, y in inside:
+        for nx in (x - 1, x, x + 1):
+            if 0 <= nx < width:
+                for ny in (y - 1, y, y + 1):
+                    if 0 <= ny < height and mapObj[nx][ny] in solver.WALLS: walls.add((nx, ny))
+    cells = inside | walls
+    minx, maxx = min(x for x, y in cells), max(x for x, y in cells)
+    miny, maxy = min(y for x, y in cells), max(y for x, y in cells)
+
+    grid = [[' '] * (maxx - minx + 1) for y in range(miny, maxy + 1)]
+    for x, y in walls: grid[y - miny][x - minx] = '#'
+    for x, y in inside - reach: grid[y - miny][x - minx] = '-'
+    for x, y in reach: grid[y - miny][x - minx] = 'r' # the player can walk here
+    for x, y in goals: grid[y - miny][x - minx] = 'R' if (x, y) in reach else '.'
+    for x, y in stars: grid[y - miny][x - minx] = '*' if (x, y) in goals else '$'
+    variants = []
+    for i in range(4):
+        grid = [list(row) for row in zip(*grid[::-1])] # rotate 90 degrees
+        variants.append('\n'.join(''.join(row) for row in grid))
+        variants.append('\n'.join(''.join(row[::-1]) for row in grid)) # and its mirror image
+    return min(variants)
+
+def levelHash(levelObj, floor=None):
+    """Returns a short hex hash of canonicalLevel(levelObj)."""
+    return hashlib.blake2b(canonicalLevel(levelObj, floor).encode(), digest_size=16).hexdigest()
+
+def normalizedRows(levelObj):
+    """Returns the map lines of the level in its canonical form: trimmed,
+    rotated and mirrored like canonicalLevel(), with the player on the first
+    position of its area in reading order."""
+    rows = []
+    playerPlaced = False
+    for line in canonicalLevel(levelObj).split('\n'):
+        row = ''
+        for char in line:
+            if char in ('r', 'R') and not playerPlaced:
+                row += '+' if char == 'R' else '@'
+                playerPlaced = True
+            else: row += {'r': ' ', 'R': '.', '-': ' '}.get(char, char)
+        rows.append(row.rstrip())
+    return rows
+
+def levelRows(levelObj):
+    """Returns the map lines of a level object read by makeLevelObj(), as they were in the file."""
+    mapObj = levelObj['mapObj']
+    return [''.join(mapObj[x][y] for x in range(len(mapObj))).rstrip() for y in range(len(mapObj[0]))]
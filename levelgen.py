@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Procedural level generator for Star Pusher.
+
+Levels are written in the same text format readLevelsFile() reads, so the
+output can be played directly or appended to starPusherLevels.txt:
+    python3 levelgen.py --count 1000 --jobs 4 --seed 1 --out generated.txt
+
+How a level is made:
+    * A room is built from random 3x3 templates, walls are put around it.
+    * Goals are placed on random floor cells, with a star on each of them.
+    * The stars are pulled away from the goals by a player walking backwards.
+      Every pull can be undone by a push, so the level is always solvable.
+    * The solver scores the difficulty by its effort and the solution length.
+
+Every level is made from its own seed, written in the comment above it. Seeds
+are tried in order starting at --seed, so a level can be made again on its own
+and the output doesn't depend on --jobs.
+"""
+
+import argparse, math, random, sys
+from multiprocessing import Pool
+import solver
+
+# Room templates, '#' is wall and ' ' is floor. Each is rotated randomly.
+TEMPLATES = [['   ', '   ', '   '],
+             ['#  ', '   ', '   '],
+             ['## ', '## ', '   '],
+             ['###', '   ', '   '],
+             ['#  ', '#  ', '   '],
+             [' # ', '   ', '   '],
+             ['#  ', '   ', '  #'],
+             ['###', '###', '###'],
+             ['## ', '   ', '   '],
+             [' # ', ' # ', '   '],
+             ['#  ', '## ', '   '],
+             ['   ', ' # ', '   ']]
+
+MAX_PULLS = 300 # random pull attempts to scramble the stars
+GEN_MAX_STATES = 20000 # solver budget to score a level
+MAX_SEEDS_PER_LEVEL = 1000 # give up when this many seeds per wanted level gave nothing usable
+
+def rotate(template):
+    """Returns template rotated by 90 degrees."""
+    return [''.join(template[len(template) - 1 - y][x] for y in range(len(template))) for x in range(len(template[0]))]
+
+def makeRoom(rnd, blocksWide, blocksHigh):
+    """Returns the set of (x, y) floor positions of a connected room, or None
+    if the templates left too little floor."""
+    floor = set()
+    for bx in range(blocksWide):
+        for by in range(blocksHigh):
+            template = rnd.choice(TEMPLATES)
+            for i in range(rnd.randint(0, 3)): template = rotate(template)
+            for y in range(3):
+                for x in range(3):
+                    # + 1 leaves room for the outer wall
+                    if template[y][x] == ' ': floor.add((bx * 3 + x + 1, by * 3 + y + 1))
+    if not floor: return None
+    # Keep the biggest connected part of the floor, the rest becomes wall.
+    biggest = set()
+    todo = set(floor)
+    while todo:
+        part, _ = solver.playerReach(floor, set(), todo.pop())
+        todo -= part
+        if len(part) > len(biggest): biggest = part
+    if len(biggest) < blocksWide * blocksHigh * 3: return None
+    return biggest
+
+def pullStars(rnd, floor, goals):
+    """Starts with a star on every goal and pulls them away by walking the player
+    backwards. Returns tuple (player, stars), or None if no star moved off a goal."""
+    stars = list(goals)
+    free = [cell for cell in sorted(floor) if cell not in goals]
+    if not free: return None
+    player = rnd.choice(free)
+    for i in range(MAX_PULLS):
+        reach, _ = solver.playerReach(floor, set(stars), player)
+        pulls = []
+        for index, (x, y) in enumerate(stars):
+            for dx, dy in solver.DIRECTIONS:
+                stand = (x + dx, y + dy) # the player stands next to the star...
+                back = (x + 2 * dx, y + 2 * dy) # ...and walks backwards to here
+                if stand in reach and back in floor and back not in stars:
+                    pulls.append((index, stand, back))
+        if not pulls: break
+        index, stand, back = rnd.choice(pulls)
+        stars[index] = stand
+        player = back
+    if all(star in goals for star in stars): return None
+    # Any position the player can walk to is a valid start.
+    return rnd.choice(sorted(solver.playerReach(floor, set(stars), player)[0])), stars
+
+def difficulty(pushes, expanded):
+    """Scores a level by how hard the solver had to work and how long the solution is."""
+    return round(math.log2(expanded + 1) + pushes / 10.0, 2)
+
+def levelText(floor, goals, player, stars):
+    """Returns the level as a list of text rows in the starPusherLevels.txt format."""
+    walls = set((x + dx, y + dy) for x, y in floor for dx in (-1, 0, 1) for dy in (-1, 0, 1)) - floor
+    cells = floor | walls
+    minx = min(x for x, y in cells)
+    miny = min(y for x, y in cells)
+    rows = []
+    for y in range(miny, max(y for x, y in cells) + 1):
+        row = ''
+        for x in range(minx, max(x for x, y in cells) + 1):
+            cell = (x, y)
+            if cell in walls: row += '#'
+            elif cell == player: row += '+' if cell in goals else '@'
+            elif cell in stars: row += '*' if cell in goals else '$'
+            elif cell in goals: row += '.'
+            else: row += ' ' # inside or outside floor
+        rows.append(row.rstrip())
+    return rows
+
+def generateLevel(args):
+    """Generates the level for one seed. Returns tuple (seed, text rows,
+    difficulty, pushes), the rows are None if the seed gave no usable level."""
+    seed, blocksWide, blocksHigh, starCount = args
+    rnd = random.Random(seed)
+    floor = makeRoom(rnd, blocksWide, blocksHigh)
+    if floor is None or len(floor) < starCount * 3: return seed, None, 0, 0
+    goals = rnd.sample(sorted(floor), starCount)
+    pulled = pullStars(rnd, floor, goals)
+    if pulled is None: return seed, None, 0, 0
+    player, stars = pulled
+    pushes, expanded = solver.solve(floor, goals, player, stars, GEN_MAX_STATES)
+    # The level is solvable because of the pulls, but without a solution it can't be scored.
+    if pushes is None: return seed, None, 0, 0
+    return seed, levelText(floor, goals, player, stars), difficulty(len(pushes), expanded), len(pushes)
+
+def checkSettings(blocksWide, blocksHigh, starCount):
+    """Returns why no level can be made with these settings, or None if they are fine."""
+    if blocksWide < 1 or blocksHigh < 1: return 'the room must be at least 1 by 1 blocks'
+    if starCount < 1: return 'a level needs at least 1 star'
+    # generateLevel() wants 3 floor cells per star, a room has at most 9 per block.
+    if starCount > 3 * blocksWide * blocksHigh:
+        return 'a {} by {} room has room for at most {} stars'.format(blocksWide, blocksHigh, 3 * blocksWide * blocksHigh)
+    return None
+
+def generateLevels(count, seed=0, jobs=None, blocksWide=3, blocksHigh=3, starCount=3, minDifficulty=0, maxSeeds=None):
+    """Yields tuple (seed, text rows, difficulty, pushes) for count levels, using
+    jobs processes. Seeds are tried in order, so the result is deterministic.
+    Stops early, with fewer levels, after maxSeeds seeds (default
+    MAX_SEEDS_PER_LEVEL per level). Raises ValueError for impossible settings."""
+    problem = checkSettings(blocksWide, blocksHigh, starCount)
+    if problem: raise ValueError(problem)
+    if maxSeeds is None: maxSeeds = count * MAX_SEEDS_PER_LEVEL
+    with Pool(jobs) as pool:
+        nextSeed = seed
+        while count > 0 and nextSeed < seed + maxSeeds:
+            batch = [(s, blocksWide, blocksHigh, starCount) for s in range(nextSeed, min(nextSeed + count * 2, seed + maxSeeds))]
+            nextSeed += len(batch)
+            for result in pool.imap(generateLevel, batch, chunksize=16):
+                if result[1] is None or result[2] < minDifficulty: continue
+                yield result
+                count -= 1
+                if count == 0: break
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate Star Pusher levels.')
+    parser.add_argument('--count', type=int, default=100, help='number of levels to make')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first level')
+    parser.add_argument('--jobs', type=int, default=None, help='number of processes, default is one per CPU')
+    parser.add_argument('--width', type=int, default=3, help='room width in 3x3 blocks')
+    parser.add_argument('--height', type=int, default=3, help='room height in 3x3 blocks')
+    parser.add_argument('--stars', type=int, default=3, help='number of stars per level')
+    parser.add_argument('--min-difficulty', type=float, default=0, help='skip easier levels')
+    parser.add_argument('--out', default='-', help='level file to write, default is stdout')
+    parser.add_argument('--max-seeds', type=int, help='give up after trying this many seeds, default is {} per level'.format(MAX_SEEDS_PER_LEVEL))
+    args = parser.parse_args()
+    problem = checkSettings(args.width, args.height, args.stars)
+    if problem: parser.error(problem)
+
+    made = 0
+    out = sys.stdout if args.out == '-' else open(args.out, 'w')
+    try:
+        out.write('; Star Pusher levels made by levelgen.py\n\n')
+        for seed, rows, score, pushes in generateLevels(args.count, args.seed, args.jobs, args.width, args.height, args.stars, args.min_difficulty, args.max_seeds):
+            out.write('; seed {}, difficulty {}, pushes {}\n'.format(seed, score, pushes))
+            out.write('\n'.join(rows) + '\n\n')
+            made += 1
+    finally:
+        if out is not sys.stdout: out.close()
+    if made < args.count:
+        sys.exit('levelgen.py: only {} of {} levels found, no more seeds tried. Try fewer stars, a bigger room or a lower --min-difficulty.'.format(made, args.count))
+
+if __name__ == '__main__': main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Importer for the common Sokoban level collection formats.
+
+readLevelsFile() only reads the plain character grid of starPusherLevels.txt.
+Public collections also come as:
+    * .sok/.txt files with "Title:" and "Author:" lines around the levels,
+    * run-length encoded rows, like "4#-$.|#@ #" (| starts a new row),
+    * SLC XML files (<SokobanLevels> with <Level> and <L> elements).
+
+importLevels() reads these one level at a time, without loading the whole
+file, and yields the same level objects as readLevelsFile(), with an extra
+'metadata' dict (title, author, comment, line or level id). Other formats can
+be added with registerImporter(). To convert a collection for the game:
+    python3 levelimport.py collection.slc --out starPusherLevels.txt
+    python3 levelimport.py collection.sok --benchmark
+"""
+
+import argparse, os, re, sys, time
+import xml.etree.ElementTree as ElementTree
+import levelfile, sysresources
+
+IMPORTERS = {} # format name -> (file extensions, function(file object) yielding level objects)
+
+# Alternative characters used by some collections, mapped to the ones the game uses.
+CHARACTER_MAPPING = {'-': ' ', '_': ' ', 'p': '@', 'P': '+', 'b': '$', 'B': '*'}
+MAP_ROW = re.compile(r'^[ #@+$*.\-_pPbB0-9|()]*#[ #@+$*.\-_pPbB0-9|()]*$')
+METADATA_LINE = re.compile(r'^([A-Za-z][A-Za-z -]{0,20}):\s*(.*)$')
+
+def registerImporter(name, extensions, importer):
+    """Adds an importer for a format. importer gets an open file and yields level objects."""
+    IMPORTERS[name] = (extensions, importer)
+
+def expandRle(text):
+    """Expands run-length encoded level rows: "3#" is "###", "2(#-)" is "#-#-"
+    and | starts a new row. Returns the list of rows."""
+    def expand(text, start):
+        result = ''
+        count = ''
+        i = start
+        while i < len(text):
+            char = text[i]
+            if char.isdigit(): count += char
+            elif char == '(':
+                group, i = expand(text, i + 1)
+                result += group * int(count or 1)
+                count = ''
+            elif char == ')': return result, i
+            else:
+                result += char * int(count or 1)
+                count = ''
+            i += 1
+        return result, i
+    return expand(text, 0)[0].split('|')
+
+def makeLevel(rows, metadata):
+    """Converts map rows in any of the supported character sets into a level object with metadata."""
+    expanded = []
+    for row in rows:
+        if any(char.isdigit() or char == '|' for char in row): expanded.extend(expandRle(row))
+        else: expanded.append(row)
+    levelObj = levelfile.makeLevelObj([''.join(CHARACTER_MAPPING.get(char, char) for char in row) for row in expanded])
+    levelObj['metadata'] = metadata
+    return levelObj
+
+def importText(lines):
+    """Reads .txt and .sok collections, including starPusherLevels.txt itself.
+    Text before a level becomes its comment (or its title, if it is a single line),
+    "Key: value" lines right after a level are metadata of that level. "Key: value"
+    lines before the first level are about the whole collection and are added to
+    the metadata of every level ("Title" as "collection"). Like in readLevelsFile(),
+    everything after a ; is a comment."""
+    rows = [] # map rows of the level being read
+    before = [] # text lines since the last level
+    collection = {} # metadata of the whole collection
+    metadata = {}
+    finished = None # level that ended, metadata lines may still follow it
+    levelSeen = False
+    lineNum = 0
+    for lineNum, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        mapLine = line[:line.find(';')] if ';' in line else line
+        if MAP_ROW.match(mapLine):
+            if finished is not None: # a new level starts
+                yield finished
+                finished = None
+            if not rows:
+                levelSeen = True
+                metadata = dict(collection, line=lineNum)
+                text = [l.lstrip('; ').strip() for l in before if l.lstrip('; ').strip()]
+                if len(text) == 1: metadata['title'] = text[0]
+                elif text: metadata['comment'] = '\n'.join(text)
+                before = []
+            rows.append(mapLine)
+            continue
+        if rows: # the map of a level ended
+            finished = makeLevel(rows, metadata)
+            rows = []
+        match = METADATA_LINE.match(line)
+        if finished is not None and match: # "Title: ..." after a level belongs to it
+            finished['metadata'][match.group(1).lower()] = match.group(2).strip()
+        elif not levelSeen and match: # "Title: ..." in the file's header belongs to the collection
+            key = match.group(1).lower()
+            collection['collection' if key == 'title' else key] = match.group(2).strip()
+        elif line.strip() == '' and finished is not None: # text after a blank line belongs to the next level
+            yield finished
+            finished = None
+        elif line.strip() != '': before.append(line)
+    if rows: finished = makeLevel(rows, metadata)
+    if finished is not None: yield finished
+
+def importSlc(xmlFile):
+    """Reads SLC XML collections. Each <Level> is handled and dropped as soon
+    as it has been read, so big collections don't fill the memory."""
+    collection = {} # Title and Author of the whole collection
+    for event, element in ElementTree.iterparse(xmlFile, events=('start', 'end')):
+        tag = element.tag.split('}')[-1] # drop the XML namespace
+        if event == 'start':
+            # The levels' default Copyright is on <LevelCollection>, its end comes after all of them.
+            if tag == 'LevelCollection' and element.get('Copyright'): collection['copyright'] = element.get('Copyright')
+            continue
+        if tag in ('Title', 'Author', 'Description') and element.text:
+            collection[tag.lower()] = element.text.strip()
+        elif tag == 'Level':
+            rows = [row.text or '' for row in element if row.tag.split('}')[-1] == 'L']
+            metadata = {'id': element.get('Id'), 'title': element.get('Id'), 'collection': collection.get('title')}
+            metadata['author'] = element.get('Copyright') or collection.get('copyright') or collection.get('author')
+            yield makeLevel(rows, metadata)
+            element.clear()
+
+registerImporter('text', ('.txt', '.sok', '.xsb'), importText)
+registerImporter('slc', ('.slc', '.xml'), importSlc)
+
+def importLevels(filename, formatName=None):
+    """Yields the level objects in a level collection. The format is taken
+    from formatName, the file extension or, if unknown, the start of the file."""
+    if formatName is None:
+        extension = os.path.splitext(filename)[1].lower()
+        for name, (extensions, importer) in IMPORTERS.items():
+            if extension in extensions: formatName = name
+    if formatName is None:
+        with open(filename, 'r') as f:
+            formatName = 'slc' if f.read(512).lstrip().startswith('<') else 'text'
+    importer = IMPORTERS[formatName][1]
+    with open(filename, 'rb' if formatName == 'slc' else 'r') as f:
+        for levelObj in importer(f):
+            yield levelObj
+
+def levelProblem(levelObj):
+    """Returns why readLevelsFile() would refuse a level, or None if it is fine."""
+    startState = levelObj['startState']
+    if startState['player'][0] is None: return 'it has no player ("@" or "+")'
+    if not levelObj['goals']: return 'it has no goals'
+    if len(startState['stars']) < len(levelObj['goals']): return 'it has fewer stars than goals'
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Import Sokoban level collections for Star Pusher.')
+    parser.add_argument('collection', help='level collection to read')
+    parser.add_argument('--format', choices=sorted(IMPORTERS), help='format of the collection, default is to guess it')
+    parser.add_argument('--out', help='write the levels in the starPusherLevels.txt format to this file')
+    parser.add_argument('--benchmark', action='store_true', help='only read the collection and report the speed')
+    args = parser.parse_args()
+
+    startTime = time.time()
+    count = 0
+    out = open(args.out, 'w') if args.out else None
+    try:
+        for levelObj in importLevels(args.collection, args.format):
+            count += 1
+            problem = levelProblem(levelObj)
+            if problem:
+                print('Skipped level {} of {}: {}'.format(count, args.collection, problem), file=sys.stderr)
+                continue
+            if out is not None:
+                for key, value in sorted(levelObj['metadata'].items()):
+                    if value is not None:
+                        out.write(''.join('; {}: {}\n'.format(key, line) for line in str(value).split('\n')))
+                out.write('\n'.join(levelfile.levelRows(levelObj)) + '\n\n')
+    finally:
+        if out is not None: out.close()
+    seconds = time.time() - startTime
+    if args.benchmark or out is None:
+        peak = sysresources.peakMemory()
+        maxRss = '' if peak is None else ', peak memory {} MB'.format(peak // (1024 * 1024))
+        print('{} levels in {:.2f}s, {:.0f} levels per second{}'.format(count, seconds, count / max(seconds, 1e-9), maxRss), file=sys.stderr)
+
+if __name__ == '__main__': main()
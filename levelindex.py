@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Duplicate level index for merging Star Pusher level packs.
+
+Level packs often contain the same puzzles rotated, mirrored or padded
+differently. Every imported level is hashed in its canonical form (see
+levelfile.canonicalLevel()) and the hash is stored in a persistent index, so
+each level is checked against everything imported before with one lookup:
+    python3 levelindex.py --index levels.db --out merged.txt pack1.txt pack2.txt
+
+Only levels not yet in the index are written to --out. Run it again later with
+the same index to add a new pack without the puzzles that are already known.
+With --normalize the levels are written in their trimmed canonical form.
+"""
+
+import argparse, dbm, sys
+import levelfile
+
+def importPack(filename, index, out=None, normalize=False):
+    """Adds the levels of a level file to index (a dbm or dict of level hash ->
+    where it was first seen), writing the new ones to out. Returns tuple
+    (number of new levels, number of duplicates, number of skipped bad levels)."""
+    newCount = duplicateCount = skipCount = 0
+    with open(filename, 'r') as mapFile:
+        for levelNum, (lineNum, rows) in enumerate(levelfile.iterLevelRows(mapFile), 1):
+            levelObj = levelfile.makeLevelObj(rows)
+            if levelObj['startState']['player'][0] is None:
+                print('{}:{}: level {} has no player, skipped'.format(filename, lineNum, levelNum), file=sys.stderr)
+                skipCount += 1
+                continue
+            key = levelfile.levelHash(levelObj)
+            if key in index:
+                duplicateCount += 1
+                continue
+            index[key] = '{} level {}'.format(filename, levelNum)
+            newCount += 1
+            if out is not None:
+                rows = levelfile.normalizedRows(levelObj) if normalize else levelfile.levelRows(levelObj)
+                out.write('; {} level {}\n{}\n\n'.format(filename, levelNum, '\n'.join(rows)))
+    return newCount, duplicateCount, skipCount
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge Star Pusher level packs without duplicates.')
+    parser.add_argument('packs', nargs='+', help='level files to import')
+    parser.add_argument('--index', required=True, help='index file, created if it doesn\'t exist')
+    parser.add_argument('--out', help='level file to write the new levels to')
+    parser.add_argument('--normalize', action='store_true', help='write levels in their trimmed canonical form')
+    args = parser.parse_args()
+
+    out = open(args.out, 'w') if args.out else None
+    try:
+        with dbm.open(args.index, 'c') as index:
+            for pack in args.packs:
+                print('{}: {} new, {} duplicates, {} skipped'.format(pack, *importPack(pack, index, out, args.normalize)))
+    finally:
+        if out is not None: out.close()
+
+if __name__ == '__main__': main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Load test for gameserver.py: opens many sessions at once, each playing a
+level with random moves, clicks, undos and redos, and reports the commands
+per second and the latency percentiles.
+    python3 gameserver.py --unix /tmp/starpusher.sock &
+    python3 loadtest.py --unix /tmp/starpusher.sock --sessions 2000 --commands 50
+"""
+
+import argparse, asyncio, json, random, sys, time
+import gameserver, sysresources
+
+def percentile(sortedValues, fraction):
+    """Returns the value below which fraction of the sorted values lie."""
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+def randomCommand(rnd, width, height):
+    kind = rnd.random()
+    if kind < 0.6: return {'cmd': 'move', 'dir': rnd.choice(gameserver.DIRECTIONS)}
+    if kind < 0.85: return {'cmd': 'click', 'x': rnd.randrange(width), 'y': rnd.randrange(height)}
+    if kind < 0.95: return {'cmd': 'undo'}
+    return {'cmd': 'redo'}
+
+async def playSession(args, sessionNum, connecting, latencies, errors):
+    """Connects, starts a level and sends args.commands random commands one
+    after the other, adding the time each answer took to latencies."""
+    rnd = random.Random('{}-{}'.format(args.seed, sessionNum))
+    async with connecting: # don't flood the server's listen backlog
+        if args.unix: reader, writer = await asyncio.open_unix_connection(args.unix)
+        else: reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        level = args.level if args.level is not None else rnd.randrange(args.level_count)
+        width = height = 0
+        for commandNum in range(args.commands + 1):
+            command = {'cmd': 'level', 'level': level} if commandNum == 0 else randomCommand(rnd, width, height)
+            command['id'] = commandNum
+            startTime = time.perf_counter()
+            writer.write(json.dumps(command).encode('utf-8') + b'\n')
+            answer = json.loads((await reader.readline()).decode('utf-8'))
+            latencies.append(time.perf_counter() - startTime)
+            if 'error' in answer or answer.get('id') != commandNum: errors.append(answer)
+            if commandNum == 0:
+                width, height = max(len(row) for row in answer['rows']), len(answer['rows'])
+    finally: writer.close()
+
+async def runLoadTest(args):
+    latencies = [] # seconds per command
+    errors = []
+    connecting = asyncio.Semaphore(args.connect_rate)
+    startTime = time.perf_counter()
+    results = await asyncio.gather(*[playSession(args, i, connecting, latencies, errors) for i in range(args.sessions)],
+                                   return_exceptions=True)
+    seconds = time.perf_counter() - startTime
+    failed = [result for result in results if isinstance(result, Exception)]
+    return latencies, errors, failed, seconds
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the speed of gameserver.py with many sessions at once.')
+    parser.add_argument('--unix', help='connect to this Unix socket path')
+    parser.add_argument('--host', default='127.0.0.1', help='connect to this address (default %(default)s)')
+    parser.add_argument('--port', type=int, default=8765, help='connect to this TCP port (default %(default)s)')
+    parser.add_argument('--sessions', type=int, default=1000, help='sessions playing at the same time')
+    parser.add_argument('--commands', type=int, default=50, help='commands per session, after starting the level')
+    parser.add_argument('--level', type=int, help='level to play, default is a random one per session')
+    parser.add_argument('--level-count', type=int, default=10, help='random levels are taken from the first this many')
+    parser.add_argument('--connect-rate', type=int, default=256, help='sessions connecting at the same time')
+    parser.add_argument('--seed', default='1', help='seed for the random commands')
+    args = parser.parse_args()
+
+    sysresources.raiseFileLimit()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try: latencies, errors, failed, seconds = loop.run_until_complete(runLoadTest(args))
+    finally: loop.close()
+
+    if failed: print('{} sessions failed, the first with: {!r}'.format(len(failed), failed[0]), file=sys.stderr)
+    if errors: print('{} error answers, the first: {!r}'.format(len(errors), errors[0]), file=sys.stderr)
+    if not latencies: sys.exit('no commands were answered')
+    latencies.sort()
+    print('{} sessions, {} commands in {:.2f}s: {:.0f} commands per second'.format(
+        args.sessions - len(failed), len(latencies), seconds, len(latencies) / seconds))
+    print('latency ms: p50 {:.2f}, p90 {:.2f}, p99 {:.2f}, p99.9 {:.2f}, max {:.2f}'.format(
+        *[1000 * percentile(latencies, fraction) for fraction in (0.5, 0.9, 0.99, 0.999)] + [1000 * latencies[-1]]))
+    sys.exit(1 if failed or errors else 0)
+
+if __name__ == '__main__': main()
@@ -20,15 +20,15 @@ try:
 except ImportError:
     pass
 
-import random, sys, copy, os, pygame
+import random, sys, copy, os, time, threading, pygame
 from pygame.locals import *
-import queue
 import json
 import pickle
-from enum import Enum
-
-class GameStateItem(Enum):
-    SELECTED_STAR_INDEX = 4
+import hashlib
+import collections
+import concurrent.futures
+import solver, levelfile
+from gamelogic import UP, DOWN, LEFT, RIGHT, SELECTED_STAR, makeMove, floorMap, clickTile, PushFieldCache, isLevelFinished
 
 class Settings:
     """Saved current level idex, window width and height and if fullscreen"""
@@ -37,22 +37,56 @@ class Settings:
         self.window_width = 0
         self.window_height = 0
         self.fullscreen = True
+        self.solved_levels = set() # levelKey() of the levels that were solved
     def save(self):
         """Saves the settings in a file"""
         try:
             with open('settings.json', 'w') as f:
-                json.dump(self.__dict__, f, sort_keys=True, indent=4)
+                values = dict(self.__dict__, solved_levels=sorted(self.solved_levels)) # JSON has no sets
+                json.dump(values, f, sort_keys=True, indent=4)
         except Exception as e: print("Error settings.save(): {}".format(str(e)))
     def load(self):
         """Loads the settings from a file"""
         try:
             with open('settings.json', 'r') as f:
-                self.__dict__ = json.load(f)
+                self.__dict__.update(json.load(f)) # keep the defaults of settings added later
+                self.solved_levels = set(self.solved_levels)
         except Exception as e:
             print("Error settings.load(): {}".format(str(e)))
 settings = Settings()
 settings.load()
 
+class FixedTimestep:
+    """Counts how many fixed-length logic ticks are due each frame, so the
+    game logic runs at the same speed whatever the frame rate is."""
+    def __init__(self, ticksPerSecond, maxTicksPerFrame):
+        self.tickMs = 1000.0 / ticksPerSecond
+        self.maxTicksPerFrame = maxTicksPerFrame
+        self.lastMs = None
+        self.accumulatorMs = 0.0 # time not yet used up by ticks
+    def advance(self, nowMs):
+        """Returns the number of ticks to run for a frame at nowMs (pygame.time.get_ticks())."""
+        if self.lastMs == None: self.lastMs = nowMs - self.tickMs # run a tick on the first frame
+        self.accumulatorMs += nowMs - self.lastMs
+        self.lastMs = nowMs
+        ticks = int(self.accumulatorMs // self.tickMs)
+        self.accumulatorMs -= ticks * self.tickMs
+        if ticks > self.maxTicksPerFrame: # don't try to catch up after a long stall
+            ticks = self.maxTicksPerFrame
+            self.accumulatorMs = 0.0
+        return ticks
+    def alpha(self):
+        """Returns how far (0 to 1) this frame is from the last tick to the next, to interpolate with."""
+        return self.accumulatorMs / self.tickMs
+
+def coalesceEvents(events):
+    """Returns the events the game loop handles, in order. Mouse motion is
+    dropped and of several window resizes only the last one is kept."""
+    lastResize = None
+    for event in events:
+        if event.type == VIDEORESIZE: lastResize = event
+    return [event for event in events if event.type in (QUIT, KEYDOWN, KEYUP, MOUSEBUTTONUP) or event is lastResize]
+
 #FPS = 30 # frames per second to update the screen
 def set_window_size(size, fullscreen = False):
     global DISPLAYSURF, WINWIDTH, WINHEIGHT, HALF_WINWIDTH, HALF_WINHEIGHT
@@ -73,7 +107,24 @@ TILEWIDTH = 50
 TILEHEIGHT = 85
 TILEFLOORHEIGHT = 40
 
-CAM_MOVE_SPEED = 5 # how many pixels per frame the camera moves
+GAME_VERSION = '1.0' # same as "version" in .android.json
+STARTUP_TIMINGS_FILE = 'startup_timings.jsonl' # saveStartupTimings() adds a line on every start
+
+CAM_MOVE_SPEED = 5 # how many pixels per logic tick the camera moves
+
+LOGIC_TICKS_PER_SECOND = 60 # game logic runs at this fixed rate, see FixedTimestep
+MAX_TICKS_PER_FRAME = 10 # on a very slow frame the game slows down instead of catching up forever
+WALK_TICKS = 6 # ticks per step when walking continuously with ALT
+MAX_FPS = 60 # the screen is redrawn at most this many times per second
+
+# Level previews on the level select screen.
+THUMB_WIDTH = 160
+THUMB_HEIGHT = 120
+THUMB_MARGIN = 20 # pixels between the previews
+THUMB_WORKERS = 2 # threads drawing previews
+THUMB_DECORATION_SEED = 1 # previews always get the same trees and rocks
+THUMB_CACHE_DIR = 'thumbnails' # previews are saved here, named by a hash of the level
+THUMB_MEMORY_LIMIT = 300 # previews kept in memory, the least recently shown are dropped
 
 # The percentage of outdoor tiles that have additional
 # decoration on them, such as a tree or rock.
@@ -85,13 +136,10 @@ BLACK      = (0,0,0)
 BGCOLOR = BLACK
 TEXTCOLOR = WHITE
 
-UP = 'up'
-DOWN = 'down'
-LEFT = 'left'
-RIGHT = 'right'
-
 def main():
-    global FPSCLOCK, DISPLAYSURF, IMAGESDICT, TILEMAPPING, OUTSIDEDECOMAPPING, BASICFONT, PLAYERIMAGES, currentImage, savedGameStateObj
+    global FPSCLOCK, DISPLAYSURF, IMAGESDICT, BASICFONT, currentImage, savedGameStateObj
+    startTime = time.time()
+    timings = {} # milliseconds since startTime, see saveStartupTimings()
 
     # Pygame initialization and basic set up of the global variables.
     pygame.init()
@@ -103,6 +151,7 @@ def main():
     # when pygame.display.update() is called.
     set_window_size((settings.window_width, settings.window_height), settings.fullscreen)
     #DISPLAYSURF = pygame.display.set_mode((WINWIDTH, WINHEIGHT),HWSURFACE|DOUBLEBUF|FULLSCREEN)
+    timings['pygame init'] = int((time.time() - startTime) * 1000)
 
     pygame.display.set_caption('Star Pusher Fork')
     #BASICFONT = pygame.font.Font('freesansbold.ttf', 18)
@@ -110,58 +159,28 @@ def main():
 
     # A global dict value that will contain all the Pygame
     # Surface objects returned by pygame.image.load().
-    IMAGESDICT = {'uncovered goal': pygame.image.load('RedSelector.png'),
-                  'covered goal': pygame.image.load('Selector.png'),
-                  'star': pygame.image.load('Star.png'),
-                  'star red': pygame.image.load('star_red.png'),
-                  'corner': pygame.image.load('Wall_Block_Tall.png'),
-                  'wall': pygame.image.load('Wood_Block_Tall.png'),
-                  'inside floor': pygame.image.load('Plain_Block.png'),
-                  'outside floor': pygame.image.load('Grass_Block.png'),
-                  'title': pygame.image.load('star_title.png'),
-                  'solved': pygame.image.load('star_solved.png'),
-                  'princess': pygame.image.load('princess.png'),
-                  'boy': pygame.image.load('boy.png'),
-                  'catgirl': pygame.image.load('catgirl.png'),
-                  'horngirl': pygame.image.load('horngirl.png'),
-                  'pinkgirl': pygame.image.load('pinkgirl.png'),
-                  'rock': pygame.image.load('Rock.png'),
-                  'short tree': pygame.image.load('Tree_Short.png'),
-                  'tall tree': pygame.image.load('Tree_Tall.png'),
-                  'ugly tree': pygame.image.load('Tree_Ugly.png')}
+    # Only the title is needed for the start screen, loadSprites() adds the rest.
+    IMAGESDICT = {'title': pygame.image.load('star_title.png')}
+    currentImage = 0 # index of the player's current player image in PLAYERIMAGES
 
-    # These dict values are global, and map the character that appears
-    # in the level file to the Surface object it represents.
-    TILEMAPPING = {'x': IMAGESDICT['corner'],
-                   '#': IMAGESDICT['wall'],
-                   'o': IMAGESDICT['inside floor'],
-                   ' ': IMAGESDICT['outside floor']}
-    OUTSIDEDECOMAPPING = {'1': IMAGESDICT['rock'],
-                          '2': IMAGESDICT['short tree'],
-                          '3': IMAGESDICT['tall tree'],
-                          '4': IMAGESDICT['ugly tree']}
-
-    # PLAYERIMAGES is a list of all possible characters the player can be.
-    # currentImage is the index of the player's current player image.
-    currentImage = 0
-    PLAYERIMAGES = [IMAGESDICT['princess'],
-                    IMAGESDICT['boy'],
-                    IMAGESDICT['catgirl'],
-                    IMAGESDICT['horngirl'],
-                    IMAGESDICT['pinkgirl']]
+    # Load everything else in the background while the start screen is showing.
+    loaded = {} # filled by loadInBackground()
+    loader = threading.Thread(target=loadInBackground, args=(startTime, timings, loaded), daemon=True)
+    loader.start()
 
+    timings['start screen'] = int((time.time() - startTime) * 1000)
     startScreen() # show the title screen until the user presses a key
 
-    # Read in the levels from the text file. See the readLevelsFile() for
-    # details on the format of this file and how to make your own levels.
-    levels = readLevelsFile('starPusherLevels.txt')
-
-    savedGameStateObj = None
-    try:
-        with open('gameStateObj.pkl', 'rb') as f:
-            savedGameStateObj = pickle.load(f)
-    except Exception as e:
-        print("Error loading gameStateObj.pkl: {}".format(str(e)))
+    # Wait until the background loading is done, keeping the window responsive.
+    waitStart = time.time()
+    while loader.is_alive():
+        loader.join(0.05)
+        for event in pygame.event.get(QUIT):
+            terminate()
+    if 'error' in loaded: raise loaded['error']
+    timings['waited for loading'] = int((time.time() - waitStart) * 1000)
+    saveStartupTimings(timings)
+    levels = loaded['levels']
 
     # The main game loop. This loop runs a single level, when the user
     # finishes that level, the next/previous level is loaded.
@@ -173,7 +192,10 @@ def main():
         # except Exception as ex:
         #     print("Error in runLevel, retrying without savedGameStateObj: {}".format(str(ex)))
         savedGameStateObj = None
-        if result in ('solved', 'next'):
+        if result == 'solved': settings.solved_levels.add(levelKey(levels[settings.current_level_index]))
+        if result == 'select':
+            pass # runLevel() already switched to the chosen level
+        elif result in ('solved', 'next'):
             # Go to the next level.
             settings.current_level_index += 1
             if settings.current_level_index >= len(levels):
@@ -188,12 +210,105 @@ def main():
         elif result == 'reset':
             pass # Do nothing. Loop re-calls runLevel() to reset the level
 
+def loadSprites():
+    """Loads all images except the title into IMAGESDICT and sets up the
+    TILEMAPPING, OUTSIDEDECOMAPPING and PLAYERIMAGES globals."""
+    global TILEMAPPING, OUTSIDEDECOMAPPING, PLAYERIMAGES
+    images = {'uncovered goal': pygame.image.load('RedSelector.png'),
+              'covered goal': pygame.image.load('Selector.png'),
+              'star': pygame.image.load('Star.png'),
+              'star red': pygame.image.load('star_red.png'),
+              'corner': pygame.image.load('Wall_Block_Tall.png'),
+              'wall': pygame.image.load('Wood_Block_Tall.png'),
+              'inside floor': pygame.image.load('Plain_Block.png'),
+              'outside floor': pygame.image.load('Grass_Block.png'),
+              'solved': pygame.image.load('star_solved.png'),
+              'princess': pygame.image.load('princess.png'),
+              'boy': pygame.image.load('boy.png'),
+              'catgirl': pygame.image.load('catgirl.png'),
+              'horngirl': pygame.image.load('horngirl.png'),
+              'pinkgirl': pygame.image.load('pinkgirl.png'),
+              'rock': pygame.image.load('Rock.png'),
+              'short tree': pygame.image.load('Tree_Short.png'),
+              'tall tree': pygame.image.load('Tree_Tall.png'),
+              'ugly tree': pygame.image.load('Tree_Ugly.png')}
+    # A see-through red star marks where a hint wants the selected star to go.
+    images['star hint'] = images['star red'].copy()
+    images['star hint'].set_alpha(128)
+    # A blue floor marks where the selected star can be pushed to.
+    images['push target'] = images['inside floor'].copy()
+    images['push target'].fill((140, 200, 255), special_flags=BLEND_RGB_MULT)
+    IMAGESDICT.update(images)
+
+    # These dict values are global, and map the character that appears
+    # in the level file to the Surface object it represents.
+    TILEMAPPING = {'x': IMAGESDICT['corner'],
+                   '#': IMAGESDICT['wall'],
+                   'o': IMAGESDICT['inside floor'],
+                   ' ': IMAGESDICT['outside floor']}
+    OUTSIDEDECOMAPPING = {'1': IMAGESDICT['rock'],
+                          '2': IMAGESDICT['short tree'],
+                          '3': IMAGESDICT['tall tree'],
+                          '4': IMAGESDICT['ugly tree']}
+
+    # PLAYERIMAGES is a list of all possible characters the player can be.
+    PLAYERIMAGES = [IMAGESDICT['princess'],
+                    IMAGESDICT['boy'],
+                    IMAGESDICT['catgirl'],
+                    IMAGESDICT['horngirl'],
+                    IMAGESDICT['pinkgirl']]
+
+def loadInBackground(startTime, timings, loaded):
+    """Loads the sprites, the levels and the saved game state while the start
+    screen is showing. Runs in a thread: the levels are put in loaded['levels'],
+    an exception in loaded['error'] so main() can raise it."""
+    global savedGameStateObj
+    try:
+        loadSprites()
+        timings['sprites'] = int((time.time() - startTime) * 1000)
+
+        # Read in the levels from the text file. See the readLevelsFile() for
+        # details on the format of this file and how to make your own levels.
+        loaded['levels'] = readLevelsFile('starPusherLevels.txt')
+        timings['levels'] = int((time.time() - startTime) * 1000)
+
+        savedGameStateObj = None
+        try:
+            with open('gameStateObj.pkl', 'rb') as f:
+                savedGameStateObj = pickle.load(f)
+        except Exception as e:
+            print("Error loading gameStateObj.pkl: {}".format(str(e)))
+        timings['saved state'] = int((time.time() - startTime) * 1000)
+    except Exception as e:
+        loaded['error'] = e
+
+def saveStartupTimings(timings):
+    """Adds a line with the startup timings (milliseconds since main() started)
+    to STARTUP_TIMINGS_FILE, to track the cold start time per release: 'saved
+    state' is when the background loading was done, 'waited for loading' how
+    long the player still waited for it after leaving the title screen. Times
+    after the title screen depend on how long the player stayed there."""
+    try:
+        with open(STARTUP_TIMINGS_FILE, 'a') as f:
+            record = {'version': GAME_VERSION, 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'platform': sys.platform}
+            record.update(timings)
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+    except Exception as e: print("Error saving startup timings: {}".format(str(e)))
+
+hintEngine = None # solver.HintEngine of the current level
+
 def runLevel(levels, levelNum):
-    global currentImage, gameStateObj
+    global currentImage, gameStateObj, hintEngine
     levelObj = levels[levelNum]
     gameStateObj = copy.deepcopy(levelObj['startState'])
     if savedGameStateObj != None: gameStateObj = savedGameStateObj
     mapObj = decorateMap(levelObj['mapObj'], gameStateObj['player'])
+    # Start searching for a solution in the background, so hints are ready when asked for.
+    if hintEngine != None: hintEngine.stop()
+    hintEngine = solver.HintEngine(mapObj, levelObj['goals'], gameStateObj)
+    hint = None # (star position, new star position) of the last hint
+    hintRequested = False
+    pushFields = PushFieldCache() # where the selected star can go, searched once per selection and state
     mapWidth = len(mapObj) * TILEWIDTH
     mapHeight = (len(mapObj[0]) - 1) * TILEFLOORHEIGHT + TILEHEIGHT
     MAX_CAM_X_PAN = abs(HALF_WINHEIGHT - int(mapHeight / 2)) + TILEWIDTH
@@ -214,163 +329,178 @@ def runLevel(levels, levelNum):
     jump = 0
     gameStateObjHistory = []
     gameStateObjRedoList = []
+    logicClock = FixedTimestep(LOGIC_TICKS_PER_SECOND, MAX_TICKS_PER_FRAME)
+    pendingEvents = [] # input not handled yet by a logic tick
+    walkDelay = 0 # ticks until the next step when walking continuously
+    previousCameraOffsetX = 0 # camera offset before the last tick
+    previousCameraOffsetY = 0
     while True: # main game loop
-        playerMoveRepeat = 1 # Reset these variables:
-        keyPressed = False
-        isRedo = False
-        isUndo = False
-        for event in pygame.event.get(): # event handling loop
-            if event.type == QUIT: terminate() # Player clicked the "X" at the corner of the window.
-            elif event.type==VIDEORESIZE:
-                mapNeedsRedraw = True
-                set_window_size(event.dict['size'])
-                MAX_CAM_X_PAN = abs(HALF_WINHEIGHT - int(mapHeight / 2)) + TILEWIDTH
-                MAX_CAM_Y_PAN = abs(HALF_WINWIDTH - int(mapWidth / 2)) + TILEHEIGHT
-            if event.type == pygame.MOUSEBUTTONUP:
-                if levelIsComplete: return 'solved'
-                mapNeedsRedraw = True
-                # if y < int(WINHEIGHT / 3): playerMoveTo = UP
-                # elif y > int(WINHEIGHT / 3 * 2): playerMoveTo = DOWN
-                # else:
-                #     if x < int(WINWIDTH / 2): playerMoveTo = LEFT
-                #     else: playerMoveTo = RIGHT
-                mousex, mousey = pygame.mouse.get_pos()
-                cameraOffsetX_tiles = 0 if cameraOffsetX == 0 else cameraOffsetX / TILEWIDTH
-                cameraOffsetY_tiles = 0 if cameraOffsetY == 0 else cameraOffsetY / TILEFLOORHEIGHT
-                mouseTileX = (0 if mousex - HALF_WINWIDTH == 0 else (mousex - HALF_WINWIDTH) / TILEWIDTH)  + len(mapObj) / 2 - .5 - cameraOffsetX_tiles
-                mouseTileY = (mousey - HALF_WINHEIGHT) / (TILEFLOORHEIGHT) + len(mapObj[0]) / 2 - .5 - cameraOffsetY_tiles
-                mouseTileX = int(round(mouseTileX, 0))
-                mouseTileY = int(round(mouseTileY, 0))
-                mouseTile = (mouseTileX, mouseTileY)
-                if not isBlocked(mapObj, gameStateObj, mouseTileX, mouseTileY):
-                    if gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] != None: # push star
-                        selectedStar = gameStateObj['stars'][gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name]]
-                        distance, player = pushStar(mapObj, gameStateObj, selectedStar, mouseTile) or (None, None)
-                        if distance != None and distance > 0:
-                            jump = distance
-                            gameStateObj['stepCounter'] += distance
-                            gameStateObj['player'] = player
-                            # Move the star.
-                            gameStateObj['stars'][gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name]] = mouseTile
-                    else: # teleport
-                        gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] = None
-                        # Create mesh, draw current location of stars:
-                        mesh = copy.deepcopy(mapObj)
-                        for star_x, star_y in gameStateObj['stars']: mesh[star_x][star_y] = "$"
-                        distance = BFS(mesh, gameStateObj['player'], mouseTile)
-                        if not distance == None and distance > 0:
-                            jump = distance
-                            gameStateObj['stepCounter'] += distance
-                            gameStateObj['player'] = mouseTile
-                        else: jump = 0
-                elif mouseTile in gameStateObj['stars']:
-                    # select or unselect star
-                    mouseTileStarIndex = gameStateObj['stars'].index(mouseTile)
-                    if mouseTileStarIndex == gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name]:
-                        gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] = None
-                    else:
-                        # see if player could walk to it
-                        mesh = copy.deepcopy(mapObj)
-                        for star_x, star_y in gameStateObj['stars']: 
-                            if not (star_x == mouseTileX and star_y == mouseTileY): mesh[star_x][star_y] = "$"
-                        distance = BFS(mesh, gameStateObj['player'], mouseTile)
-                        if not distance == None:
-                            gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] = mouseTileStarIndex
-                else: # click on wall
-                    if gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] != None:
-                        gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] = None
-            elif event.type == KEYDOWN:
-                if levelIsComplete: return 'solved'
-                mapNeedsRedraw = True
-                keyPressed = True
-                if event.key == K_z:
-                    if (pygame.key.get_mods() & KMOD_CTRL) and (pygame.key.get_mods() & KMOD_SHIFT): # redo
-                        if len(gameStateObjRedoList) > 0:
-                            gameStateObj = gameStateObjRedoList.pop()
-                            isRedo = True
-                    elif (pygame.key.get_mods() & KMOD_CTRL): # undo
-                        if len(gameStateObjHistory) > 1:
-                            gameStateObjRedoList.append(gameStateObj)
-                            gameStateObjHistory.pop()
-                            gameStateObj = gameStateObjHistory.pop()
-                            isUndo = True
-                elif event.key == K_f:
-                    set_window_size((settings.window_width, settings.window_height), not settings.fullscreen)
+        # Game logic runs in fixed ticks, so it runs at the same speed on slow
+        # and fast devices. Input is buffered until a tick handles it, and the
+        # screen is drawn once per frame, however many ticks were run.
+        pendingEvents.extend(coalesceEvents(pygame.event.get()))
+        for tick in range(logicClock.advance(pygame.time.get_ticks())):
+            playerMoveRepeat = 1 # Reset these variables:
+            keyPressed = False
+            isRedo = False
+            isUndo = False
+            while len(pendingEvents) > 0: # event handling loop
+                event = pendingEvents.pop(0)
+                if event.type == QUIT: terminate() # Player clicked the "X" at the corner of the window.
+                elif event.type==VIDEORESIZE:
+                    mapNeedsRedraw = True
+                    set_window_size(event.dict['size'])
                     MAX_CAM_X_PAN = abs(HALF_WINHEIGHT - int(mapHeight / 2)) + TILEWIDTH
                     MAX_CAM_Y_PAN = abs(HALF_WINWIDTH - int(mapWidth / 2)) + TILEHEIGHT
-                elif event.key == K_a: cameraLeft = True # Set the camera move mode.
-                elif event.key == K_d: cameraRight = True
-                elif event.key == K_w: cameraUp = True
-                elif event.key == K_s: cameraDown = True
-                elif event.key == K_n: return 'next'
-                elif event.key == K_b: return 'back'
-                elif event.key == K_ESCAPE: terminate() # Esc key quits.
-                elif event.key == K_BACKSPACE: return 'reset' # Reset the level.
-                #elif event.key == K_AC_BACK: return 'reset' # Reset the level.
-                elif event.key == K_p:
-                    currentImage += 1 # Change the player image to the next one.
-                    if currentImage >= len(PLAYERIMAGES): currentImage = 0
-                elif event.key == K_LEFT: playerMoveTo = LEFT
-                elif event.key == K_RIGHT: playerMoveTo = RIGHT
-                elif event.key == K_UP: playerMoveTo = UP
-                elif event.key == K_DOWN: playerMoveTo = DOWN
-                if playerMoveTo != None:
-                    if (pygame.key.get_mods() & KMOD_CTRL): playerMoveRepeat = 5
-                    elif (pygame.key.get_mods() & KMOD_SHIFT): playerMoveRepeat = 100
-
-            elif event.type == KEYUP:
-                if event.key == K_a: cameraLeft = False # Unset the camera move mode.
-                elif event.key == K_d: cameraRight = False
-                elif event.key == K_w: cameraUp = False
-                elif event.key == K_s: cameraDown = False
-                elif event.key == K_UP or event.key == K_DOWN or event.key == K_LEFT or event.key == K_RIGHT:
-                    playerMoveTo = None
-
-        if keyPressed == False and (pygame.key.get_mods() & KMOD_ALT) == False: 
-            playerMoveTo = None
-
-        if playerMoveTo != None and not levelIsComplete:
-            # If the player pushed a key to move, make the move
-            # (if possible) and push any stars that are pushable.
-            countJump = True if playerMoveRepeat > 1 else False
-            if countJump: jump = 0
-            while playerMoveRepeat > 0:
-                playerMoveRepeat -= 1
-                moved = makeMove(mapObj, gameStateObj, playerMoveTo)
-                if moved:
-                    # increment the step counter.
-                    gameStateObj['stepCounter'] += 1
+                if event.type == pygame.MOUSEBUTTONUP:
+                    if levelIsComplete: return 'solved'
+                    mapNeedsRedraw = True
+                    hintRequested = False
+                    # if y < int(WINHEIGHT / 3): playerMoveTo = UP
+                    # elif y > int(WINHEIGHT / 3 * 2): playerMoveTo = DOWN
+                    # else:
+                    #     if x < int(WINWIDTH / 2): playerMoveTo = LEFT
+                    #     else: playerMoveTo = RIGHT
+                    mousex, mousey = event.pos # where the click was, the mouse may have moved since
+                    cameraOffsetX_tiles = 0 if cameraOffsetX == 0 else cameraOffsetX / TILEWIDTH
+                    cameraOffsetY_tiles = 0 if cameraOffsetY == 0 else cameraOffsetY / TILEFLOORHEIGHT
+                    mouseTileX = (0 if mousex - HALF_WINWIDTH == 0 else (mousex - HALF_WINWIDTH) / TILEWIDTH)  + len(mapObj) / 2 - .5 - cameraOffsetX_tiles
+                    mouseTileY = (mousey - HALF_WINHEIGHT) / (TILEFLOORHEIGHT) + len(mapObj[0]) / 2 - .5 - cameraOffsetY_tiles
+                    mouseTileX = int(round(mouseTileX, 0))
+                    mouseTileY = int(round(mouseTileY, 0))
+                    mouseTile = (mouseTileX, mouseTileY)
+                    steps = clickTile(mapObj, gameStateObj, mouseTile, pushFields)
+                    if steps != None: jump = steps
+                elif event.type == KEYDOWN:
+                    if levelIsComplete: return 'solved'
+                    mapNeedsRedraw = True
+                    keyPressed = True
+                    hintRequested = False
+                    if event.key == K_z:
+                        if (event.mod & KMOD_CTRL) and (event.mod & KMOD_SHIFT): # redo
+                            if len(gameStateObjRedoList) > 0:
+                                gameStateObj = gameStateObjRedoList.pop()
+                                isRedo = True
+                        elif (event.mod & KMOD_CTRL): # undo
+                            if len(gameStateObjHistory) > 1:
+                                gameStateObjRedoList.append(gameStateObj)
+                                gameStateObjHistory.pop()
+                                gameStateObj = gameStateObjHistory.pop()
+                                isUndo = True
+                    elif event.key == K_f:
+                        set_window_size((settings.window_width, settings.window_height), not settings.fullscreen)
+                        MAX_CAM_X_PAN = abs(HALF_WINHEIGHT - int(mapHeight / 2)) + TILEWIDTH
+                        MAX_CAM_Y_PAN = abs(HALF_WINWIDTH - int(mapWidth / 2)) + TILEHEIGHT
+                    elif event.key == K_h:
+                        hintRequested = True
+                        hintEngine.request(gameStateObj) # also makes a search that gave up go on
+                    elif event.key == K_a: cameraLeft = True # Set the camera move mode.
+                    elif event.key == K_d: cameraRight = True
+                    elif event.key == K_w: cameraUp = True
+                    elif event.key == K_s: cameraDown = True
+                    elif event.key == K_n: return 'next'
+                    elif event.key == K_b: return 'back'
+                    elif event.key == K_l:
+                        chosen = levelSelectScreen(levels, levelNum)
+                        if chosen != levelNum:
+                            settings.current_level_index = chosen
+                            return 'select'
+                        # The same level: play on where the player was, with the undo history.
+                        mapNeedsRedraw = True
+                        cameraUp = cameraDown = cameraLeft = cameraRight = False # their key ups went to the select screen
+                        MAX_CAM_X_PAN = abs(HALF_WINHEIGHT - int(mapHeight / 2)) + TILEWIDTH # the window may have been resized
+                        MAX_CAM_Y_PAN = abs(HALF_WINWIDTH - int(mapWidth / 2)) + TILEHEIGHT
+                    elif event.key == K_ESCAPE: terminate() # Esc key quits.
+                    elif event.key == K_BACKSPACE: return 'reset' # Reset the level.
+                    #elif event.key == K_AC_BACK: return 'reset' # Reset the level.
+                    elif event.key == K_p:
+                        currentImage += 1 # Change the player image to the next one.
+                        if currentImage >= len(PLAYERIMAGES): currentImage = 0
+                    elif event.key == K_LEFT: playerMoveTo = LEFT
+                    elif event.key == K_RIGHT: playerMoveTo = RIGHT
+                    elif event.key == K_UP: playerMoveTo = UP
+                    elif event.key == K_DOWN: playerMoveTo = DOWN
+                    if playerMoveTo != None:
+                        if (event.mod & KMOD_CTRL): playerMoveRepeat = 5
+                        elif (event.mod & KMOD_SHIFT): playerMoveRepeat = 100
+                    if event.key in (K_LEFT, K_RIGHT, K_UP, K_DOWN):
+                        break # one move per tick, the rest of the input waits for the next tick
+
+                elif event.type == KEYUP:
+                    if event.key == K_a: cameraLeft = False # Unset the camera move mode.
+                    elif event.key == K_d: cameraRight = False
+                    elif event.key == K_w: cameraUp = False
+                    elif event.key == K_s: cameraDown = False
+                    elif event.key == K_UP or event.key == K_DOWN or event.key == K_LEFT or event.key == K_RIGHT:
+                        playerMoveTo = None
+
+            if keyPressed == False and (pygame.key.get_mods() & KMOD_ALT) == False: 
+                playerMoveTo = None
+
+            walkDelay -= 1
+            if playerMoveTo != None and not levelIsComplete and (keyPressed or walkDelay <= 0):
+                # If the player pushed a key to move, make the move
+                # (if possible) and push any stars that are pushable.
+                # Holding ALT keeps walking, one step every WALK_TICKS ticks.
+                walkDelay = WALK_TICKS
+                countJump = True if playerMoveRepeat > 1 else False
+                if countJump: jump = 0
+                while playerMoveRepeat > 0:
+                    playerMoveRepeat -= 1
+                    moved = makeMove(mapObj, gameStateObj, playerMoveTo)
+                    if moved:
+                        # increment the step counter.
+                        gameStateObj['stepCounter'] += 1
+                        mapNeedsRedraw = True
+                        if countJump: jump += 1
+                    else: playerMoveRepeat = 0
+
+            # level is solved, we should show the "Solved!" image.
+            if mapNeedsRedraw and isLevelFinished(levelObj, gameStateObj): levelIsComplete = True
+
+            if hintRequested and not levelIsComplete:
+                # Keep asking until the background search has an answer, then select the star to push.
+                hint = hintEngine.hint(gameStateObj)
+                if hint != None:
+                    hintRequested = False
+                    gameStateObj[SELECTED_STAR] = gameStateObj['stars'].index(hint[0])
                     mapNeedsRedraw = True
-                    if countJump: jump += 1
-                else: playerMoveRepeat = 0
-
-        # level is solved, we should show the "Solved!" image.
-        if mapNeedsRedraw and isLevelFinished(levelObj, gameStateObj): levelIsComplete = True
-
-        if len(gameStateObjHistory) == 0 \
-            or gameStateObjHistory[len(gameStateObjHistory)-1]['player'] != gameStateObj['player'] \
-            or gameStateObjHistory[len(gameStateObjHistory)-1][GameStateItem.SELECTED_STAR_INDEX.name] != gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name]:
-            gameStateObjHistory.append(copy.deepcopy(gameStateObj))
-            if not isRedo and not isUndo and gameStateObjRedoList != []:
-                gameStateObjRedoList = []
-        if(len(gameStateObjHistory) > 300): 
-            for i in range(len(gameStateObjHistory) - 300):
-                gameStateObjHistory.pop(0)
+            elif mapNeedsRedraw: hintEngine.update(gameStateObj) # refine the search as the player moves
+
+            if len(gameStateObjHistory) == 0 \
+                or gameStateObjHistory[len(gameStateObjHistory)-1]['player'] != gameStateObj['player'] \
+                or gameStateObjHistory[len(gameStateObjHistory)-1][SELECTED_STAR] != gameStateObj[SELECTED_STAR]:
+                gameStateObjHistory.append(copy.deepcopy(gameStateObj))
+                if not isRedo and not isUndo and gameStateObjRedoList != []:
+                    gameStateObjRedoList = []
+            if(len(gameStateObjHistory) > 300): 
+                for i in range(len(gameStateObjHistory) - 300):
+                    gameStateObjHistory.pop(0)
+
+            # Move the camera, remembering where it was to interpolate between ticks.
+            previousCameraOffsetX = cameraOffsetX
+            previousCameraOffsetY = cameraOffsetY
+            if cameraUp and cameraOffsetY < MAX_CAM_X_PAN: cameraOffsetY += CAM_MOVE_SPEED
+            elif cameraDown and cameraOffsetY > -MAX_CAM_X_PAN: cameraOffsetY -= CAM_MOVE_SPEED
+            if cameraLeft and cameraOffsetX < MAX_CAM_Y_PAN: cameraOffsetX += CAM_MOVE_SPEED
+            elif cameraRight and cameraOffsetX > -MAX_CAM_Y_PAN: cameraOffsetX -= CAM_MOVE_SPEED
 
         DISPLAYSURF.fill(BGCOLOR)
 
         if mapNeedsRedraw:
-            mapSurf = drawMap(mapObj, gameStateObj, levelObj['goals'])
+            hintTarget = None # only show the hint while its star is still selected
+            if hint != None and gameStateObj[SELECTED_STAR] != None \
+                and gameStateObj['stars'][gameStateObj[SELECTED_STAR]] == hint[0]:
+                hintTarget = hint[1]
+            pushTargets = {} if levelIsComplete else pushFields.get(mapObj, gameStateObj)
+            mapSurf = drawMap(mapObj, gameStateObj, levelObj['goals'], hintTarget, pushTargets)
             mapNeedsRedraw = False
 
-        if cameraUp and cameraOffsetY < MAX_CAM_X_PAN: cameraOffsetY += CAM_MOVE_SPEED
-        elif cameraDown and cameraOffsetY > -MAX_CAM_X_PAN: cameraOffsetY -= CAM_MOVE_SPEED
-        if cameraLeft and cameraOffsetX < MAX_CAM_Y_PAN: cameraOffsetX += CAM_MOVE_SPEED
-        elif cameraRight and cameraOffsetX > -MAX_CAM_Y_PAN: cameraOffsetX -= CAM_MOVE_SPEED
-
-        # Adjust mapSurf's Rect object based on the camera offset.
+        # Adjust mapSurf's Rect object based on the camera offset, interpolated between the last two ticks.
+        alpha = logicClock.alpha()
         mapSurfRect = mapSurf.get_rect()
-        mapSurfRect.center = (HALF_WINWIDTH + cameraOffsetX, HALF_WINHEIGHT + cameraOffsetY)
+        mapSurfRect.center = (HALF_WINWIDTH + int(previousCameraOffsetX + (cameraOffsetX - previousCameraOffsetX) * alpha),
+                              HALF_WINHEIGHT + int(previousCameraOffsetY + (cameraOffsetY - previousCameraOffsetY) * alpha))
 
         # Draw mapSurf to the DISPLAYSURF Surface object.
         DISPLAYSURF.blit(mapSurf, mapSurfRect)
@@ -383,6 +513,14 @@ def runLevel(levels, levelNum):
         stepRect = stepSurf.get_rect()
         stepRect.bottomleft = (20, WINHEIGHT - 60)
         DISPLAYSURF.blit(stepSurf, stepRect)
+        if hintRequested:
+            if hintEngine.hasFailed(gameStateObj): hintText = 'Hint: no solution from here, undo some moves'
+            elif hintEngine.hasGivenUp(gameStateObj): hintText = 'Hint: too hard to solve quickly, press H to search longer'
+            else: hintText = 'Hint: searching...'
+            hintSurf = BASICFONT.render(hintText, 1, TEXTCOLOR)
+            hintRect = hintSurf.get_rect()
+            hintRect.bottomleft = (20, WINHEIGHT - 85)
+            DISPLAYSURF.blit(hintSurf, hintRect)
         debugSurf = BASICFONT.render('Player {} {}, Mouse {} {} ({} {}), Map {} {}, Camera: {} {}'.format(gameStateObj['player'][0], gameStateObj['player'][1], mouseTileX, mouseTileY, mousex, mousey, len(mapObj), len(mapObj[0]), cameraOffsetX, cameraOffsetY), 1, TEXTCOLOR)
         debugRect = debugSurf.get_rect()
         debugRect.bottomleft = (20, WINHEIGHT - 35)
@@ -394,183 +532,30 @@ def runLevel(levels, levelNum):
             DISPLAYSURF.blit(IMAGESDICT['solved'], solvedRect)
 
         pygame.display.update() # draw DISPLAYSURF to the screen.
-        FPSCLOCK.tick()
-
-def pushStar(mapObj, gameStateObj, src, dest):
-    """returns tuple (stepCount, player position) if star can be pushed to destination, otherwise returns None"""
-    src_x, src_y = src
-    mesh = copy.deepcopy(mapObj)
-    for star_x, star_y in gameStateObj['stars']:
-        if not (star_x == src_x and star_y == src_y): mesh[star_x][star_y] = "$" # draw all stars accept the selected one
-    if dest == None: # see already if src adjoining cell can be reached by player
-        return None
-    dest_x, dest_y = dest
-    if mesh[dest_x][dest_y] != 'o': return None # inside floor
-    visited = set() # keep track of visited cells
-    visited.add(src) # Mark the source cell as visited
-    q = queue.Queue() # list to hold for each point: point currently holding the selected star, stepCount, player position
-    q.put((src, 0, gameStateObj['player'])) # 0 steps to reach src
-    while not q.empty(): # Do a BFS starting from source cell
-        (point_x, point_y), distance, (player_x, player_y) = q.get()
-        # If we have reached the destination cell, we are done..
-        if point_x == dest_x and point_y == dest_y: return (distance, (player_x, player_y))
-        # Check current cell and add neighboring cells to the queue
-        rowNum = [-1, 0, 0, 1]
-        colNum = [0, -1, 1, 0]
-        for i in range(4):
-            row = point_x + rowNum[i]
-            col = point_y + colNum[i]
-            opposite_x = point_x - rowNum[i]
-            opposite_y = point_y - colNum[i]
-            if row >= 0 and row < len(mesh) and col >= 0 and col < len(mesh[0]) and mesh[row][col] == 'o' and not (row, col) in visited:
-                # check if player can walk to opposite point to push it here
-                mesh2 = copy.deepcopy(mesh)
-                mesh2[point_x][point_y] = "$" # draw selected star in it's current position
-                playerSteps = BFS(mesh2, (player_x, player_y), (opposite_x, opposite_y))
-                if playerSteps != None:
-                    # mark cell as visited and enqueue it
-                    visited.add((row, col))
-                    q.put(((row, col), distance + playerSteps + 1, (point_x, point_y)))
-    return None # destination cannot be reached
-
-def BFS(mesh, src, dest):
-    """Breadth First Search, function to find the shortest path between a given source cell to a destination cell. https://www.geeksforgeeks.org/shortest-path-in-a-binary-maze/"""
-    src_x, src_y = src
-    dest_x, dest_y = dest
-    if mesh[src_x][src_y] != 'o' or mesh[dest_x][dest_y] != 'o': return None
-    visited = set() # keep track of visited cells
-    visited.add(src) # Mark the source cell as visited
-    q = queue.Queue() # list to hold the calculated distance for each point to dest
-    q.put((src, 0)) # 0 steps to reach src
-    while not q.empty(): # Do a BFS starting from source cell
-        (point_x, point_y), distance = q.get()
-        # If we have reached the destination cell, we are done..
-        if point_x == dest_x and point_y == dest_y: return distance
-        # Check current cell and add neighboring cells to the queue
-        rowNum = [-1, 0, 0, 1]
-        colNum = [0, -1, 1, 0]
-        for i in range(4):
-            row = point_x + rowNum[i]
-            col = point_y + colNum[i]
-            if row >= 0 and row < len(mesh) and col >= 0 and col < len(mesh[0]) and mesh[row][col] == 'o' and not (row, col) in visited:
-                # mark cell as visited and enqueue it
-                visited.add((row, col))
-                q.put(((row, col), distance + 1))
-    return None # destination cannot be reached
-
-def isWall(mapObj, x, y):
-    """Returns True if the (x, y) position on
-    the map is a wall, otherwise return False."""
-    if x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
-        return False # x and y aren't actually on the map.
-    elif mapObj[x][y] in ('#', 'x'):
-        return True # wall is blocking
-    return False
-
-
-def decorateMap(mapObj, startxy):
+        FPSCLOCK.tick(MAX_FPS)
+
+def decorateMap(mapObj, startxy, rnd=random):
     """Makes a copy of the given map object and modifies it.
     Here is what is done to it:
         * Walls that are corners are turned into corner pieces.
         * The outside/inside floor tile distinction is made.
-        * Tree/rock decorations are randomly added to the outside tiles.
+          (these two by floorMap() in gamelogic.py)
+        * Tree/rock decorations are randomly added to the outside tiles,
+          using rnd (pass a seeded random.Random to always get the same ones).
 
     Returns the decorated map object."""
 
-    startx, starty = startxy # Syntactic sugar
+    mapObjCopy = floorMap(mapObj, startxy)
 
-    # Copy the map object so we don't modify the original passed
-    mapObjCopy = copy.deepcopy(mapObj)
-
-    # Remove the non-wall characters from the map data
-    for x in range(len(mapObjCopy)):
-        for y in range(len(mapObjCopy[0])):
-            if mapObjCopy[x][y] in ('$', '.', '@', '+', '*'):
-                mapObjCopy[x][y] = ' '
-
-    # Flood fill to determine inside/outside floor tiles.
-    floodFill(mapObjCopy, startx, starty, ' ', 'o')
-
-    # Convert the adjoined walls into corner tiles.
+    # Add the trees and rocks to the outside floor.
     for x in range(len(mapObjCopy)):
         for y in range(len(mapObjCopy[0])):
-
-            if mapObjCopy[x][y] == '#':
-                if (isWall(mapObjCopy, x, y-1) and isWall(mapObjCopy, x+1, y)) or \
-                   (isWall(mapObjCopy, x+1, y) and isWall(mapObjCopy, x, y+1)) or \
-                   (isWall(mapObjCopy, x, y+1) and isWall(mapObjCopy, x-1, y)) or \
-                   (isWall(mapObjCopy, x-1, y) and isWall(mapObjCopy, x, y-1)):
-                    mapObjCopy[x][y] = 'x'
-
-            elif mapObjCopy[x][y] == ' ' and random.randint(0, 99) < OUTSIDE_DECORATION_PCT:
-                mapObjCopy[x][y] = random.choice(list(OUTSIDEDECOMAPPING.keys()))
+            if mapObjCopy[x][y] == ' ' and rnd.randint(0, 99) < OUTSIDE_DECORATION_PCT:
+                mapObjCopy[x][y] = rnd.choice(sorted(OUTSIDEDECOMAPPING.keys()))
 
     return mapObjCopy
 
 
-def isBlocked(mapObj, gameStateObj, x, y):
-    """Returns True if the (x, y) position on the map is
-    blocked by a wall or star, otherwise return False."""
-
-    if isWall(mapObj, x, y):
-        return True
-
-    elif x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
-        return True # x and y aren't actually on the map.
-
-    elif (x, y) in gameStateObj['stars']:
-        return True # a star is blocking
-
-    return False
-
-
-def makeMove(mapObj, gameStateObj, playerMoveTo):
-    """Given a map and game state object, see if it is possible for the
-    player to make the given move. If it is, then change the player's
-    position (and the position of any pushed star). If not, do nothing.
-
-    Returns True if the player moved, otherwise False."""
-
-    # Make sure the player can move in the direction they want.
-    playerx, playery = gameStateObj['player']
-
-    # This variable is "syntactic sugar". Typing "stars" is more
-    # readable than typing "gameStateObj['stars']" in our code.
-    stars = gameStateObj['stars']
-
-    # The code for handling each of the directions is so similar aside
-    # from adding or subtracting 1 to the x/y coordinates. We can
-    # simplify it by using the xOffset and yOffset variables.
-    if playerMoveTo == UP:
-        xOffset = 0
-        yOffset = -1
-    elif playerMoveTo == RIGHT:
-        xOffset = 1
-        yOffset = 0
-    elif playerMoveTo == DOWN:
-        xOffset = 0
-        yOffset = 1
-    elif playerMoveTo == LEFT:
-        xOffset = -1
-        yOffset = 0
-
-    # See if the player can move in that direction.
-    if isWall(mapObj, playerx + xOffset, playery + yOffset):
-        return False
-    else:
-        if (playerx + xOffset, playery + yOffset) in stars:
-            # There is a star in the way, see if the player can push it.
-            if not isBlocked(mapObj, gameStateObj, playerx + (xOffset*2), playery + (yOffset*2)):
-                # Move the star.
-                ind = stars.index((playerx + xOffset, playery + yOffset))
-                stars[ind] = (stars[ind][0] + xOffset, stars[ind][1] + yOffset)
-            else:
-                return False
-        # Move the player upwards.
-        gameStateObj['player'] = (playerx + xOffset, playery + yOffset)
-        return True
-
-
 def startScreen():
     """Display the start screen (which has the title and instructions)
     until the player presses a key. Returns None."""
@@ -588,11 +573,11 @@ def startScreen():
     instructionText = ['Push the stars over the marks.',
                        'Arrow keys to move, WASD for camera control, P to change character.',
                        'Backspace to reset level, Esc to quit.',
-                       'N for next level, B to go back a level.', '',
+                       'N for next level, B to go back a level, L to select a level.', '',
                        'Extra: level is saved, also:',
                        'ALT: walk continuously, CTRL walk 5 steps, SHIFT walk to end of line,',
                        'Mouseclick: teleport, F: toggle fullscreen',
-                       'CTRL+Z: undo, CTRL+SHIFT+Z: redo']
+                       'CTRL+Z: undo, CTRL+SHIFT+Z: redo, H: hint']
 
     # Start with drawing a blank color to the entire window:
     DISPLAYSURF.fill(BGCOLOR)
@@ -634,120 +619,163 @@ def startScreen():
 
         # Display the DISPLAYSURF contents to the actual screen.
         pygame.display.update()
-        FPSCLOCK.tick()
-
+        FPSCLOCK.tick(MAX_FPS)
+
+
+def levelKey(levelObj):
+    """Returns the key of a level in settings.solved_levels: the hash of its
+    content, so it stays the same when the level file is rebuilt or reordered.
+    It is worked out once per level object."""
+    if 'key' not in levelObj: levelObj['key'] = levelfile.levelHash(levelObj)
+    return levelObj['key']
+
+def thumbnailPath(levelObj):
+    """Returns the file name of the cached preview of a level, a hash of the
+    level and everything else that changes what the preview looks like."""
+    content = levelfile.levelRows(levelObj) + [str(THUMB_WIDTH), str(THUMB_HEIGHT), str(THUMB_DECORATION_SEED), str(OUTSIDE_DECORATION_PCT),
+                                               str(currentImage)] # the player's character is drawn too
+    return os.path.join(THUMB_CACHE_DIR, hashlib.sha1('\n'.join(content).encode()).hexdigest() + '.png')
+
+def loadThumbnail(levelObj):
+    """Returns a Surface with a preview of the level at its start, loaded from
+    the disk cache or drawn and saved there. Runs in a worker thread."""
+    path = thumbnailPath(levelObj)
+    if os.path.exists(path):
+        try: return pygame.image.load(path)
+        except Exception as e: print("Error loading thumbnail {}: {}".format(path, str(e)))
+    startState = levelObj['startState']
+    mapObj = decorateMap(levelObj['mapObj'], startState['player'], random.Random(THUMB_DECORATION_SEED))
+    mapSurf = drawMap(mapObj, startState, levelObj['goals'])
+    scale = min(THUMB_WIDTH / mapSurf.get_width(), THUMB_HEIGHT / mapSurf.get_height())
+    thumbSurf = pygame.transform.scale(mapSurf, (max(1, int(mapSurf.get_width() * scale)), max(1, int(mapSurf.get_height() * scale))))
+    try:
+        os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+        pygame.image.save(thumbSurf, path)
+    except Exception as e: print("Error saving thumbnail {}: {}".format(path, str(e)))
+    return thumbSurf
+
+def levelSelectScreen(levels, levelNum):
+    """Shows previews of all levels in a scrolling grid until the player picks
+    one. Previews are drawn by worker threads and show up as they are ready.
+    Only the rows on screen are loaded, so this stays smooth for thousands of
+    levels. Returns the index of the chosen level."""
+    cellWidth = THUMB_WIDTH + THUMB_MARGIN
+    cellHeight = THUMB_HEIGHT + THUMB_MARGIN + BASICFONT.get_linesize()
+    gridTop = 60 # room for the instructions
+    executor = concurrent.futures.ThreadPoolExecutor(THUMB_WORKERS)
+    thumbnails = collections.OrderedDict() # level index -> preview Surface, least recently shown first
+    loading = {} # level index -> Future of loadThumbnail()
+    solvedSurf = pygame.transform.scale(IMAGESDICT['star'], (TILEWIDTH // 2, TILEHEIGHT // 2))
+    selected = levelNum
+    followSelected = True # scroll to the selected level, unless the mouse wheel was used
+    scrollY = None # pixels the grid is scrolled down
+    targetScrollY = 0 # scrollY moves smoothly towards this
+    try:
+        while True:
+            columns = max(1, (WINWIDTH - THUMB_MARGIN) // cellWidth)
+            gridLeft = (WINWIDTH - columns * cellWidth + THUMB_MARGIN) // 2
+            viewHeight = WINHEIGHT - gridTop
+            pageSize = max(1, viewHeight // cellHeight) * columns
+            for event in pygame.event.get():
+                if event.type == QUIT: terminate()
+                elif event.type == VIDEORESIZE: set_window_size(event.dict['size'])
+                elif event.type == KEYDOWN:
+                    followSelected = True
+                    if event.key in (K_ESCAPE, K_l): return levelNum
+                    elif event.key in (K_RETURN, K_KP_ENTER, K_SPACE): return selected
+                    elif event.key == K_f: set_window_size((settings.window_width, settings.window_height), not settings.fullscreen)
+                    elif event.key == K_LEFT: selected -= 1
+                    elif event.key == K_RIGHT: selected += 1
+                    elif event.key == K_UP: selected -= columns
+                    elif event.key == K_DOWN: selected += columns
+                    elif event.key == K_PAGEUP: selected -= pageSize
+                    elif event.key == K_PAGEDOWN: selected += pageSize
+                    elif event.key == K_HOME: selected = 0
+                    elif event.key == K_END: selected = len(levels) - 1
+                    selected = max(0, min(len(levels) - 1, selected))
+                elif event.type == MOUSEBUTTONDOWN and event.button in (4, 5): # mouse wheel
+                    followSelected = False
+                    targetScrollY += cellHeight if event.button == 5 else -cellHeight
+                elif event.type == MOUSEBUTTONUP and event.button == 1:
+                    x, y = event.pos
+                    column = (x - gridLeft) // cellWidth
+                    index = int((y - gridTop + (scrollY or 0)) // cellHeight) * columns + column
+                    if y >= gridTop and 0 <= column < columns and 0 <= index < len(levels):
+                        if index == selected: return selected # second click plays it
+                        selected = index
+
+            # Scroll smoothly, keeping the selected level on screen.
+            selectedTop = (selected // columns) * cellHeight
+            if followSelected:
+                if selectedTop < targetScrollY: targetScrollY = selectedTop
+                elif selectedTop + cellHeight > targetScrollY + viewHeight: targetScrollY = selectedTop + cellHeight - viewHeight
+            maxScrollY = max(0, ((len(levels) + columns - 1) // columns) * cellHeight - viewHeight)
+            targetScrollY = max(0, min(maxScrollY, targetScrollY))
+            if scrollY == None: scrollY = targetScrollY # start at the current level
+            scrollY += (targetScrollY - scrollY) / 4.0
+            if abs(targetScrollY - scrollY) < 1: scrollY = targetScrollY
+
+            # Load the previews of the rows on screen, plus one row ahead.
+            firstIndex = int(scrollY // cellHeight) * columns
+            lastIndex = min(len(levels), int((scrollY + viewHeight) // cellHeight + 2) * columns)
+            visible = range(firstIndex, lastIndex)
+            for i in visible:
+                if i in thumbnails: thumbnails.move_to_end(i)
+                elif i not in loading: loading[i] = executor.submit(loadThumbnail, levels[i])
+            for i, future in list(loading.items()):
+                if future.done():
+                    del loading[i]
+                    try: thumbnails[i] = future.result()
+                    except Exception as e: print("Error drawing thumbnail of level {}: {}".format(i + 1, str(e)))
+                elif i not in visible and future.cancel(): del loading[i] # scrolled away before it started
+            while len(thumbnails) > THUMB_MEMORY_LIMIT: thumbnails.popitem(last=False)
+
+            DISPLAYSURF.fill(BGCOLOR)
+            for i in visible:
+                left = gridLeft + (i % columns) * cellWidth
+                top = gridTop + (i // columns) * cellHeight - int(scrollY)
+                thumbRect = pygame.Rect(left, top, THUMB_WIDTH, THUMB_HEIGHT)
+                if i == selected: pygame.draw.rect(DISPLAYSURF, BRIGHTBLUE, thumbRect.inflate(8, 8), 3)
+                if i in thumbnails:
+                    thumbSurf = thumbnails[i]
+                    DISPLAYSURF.blit(thumbSurf, thumbSurf.get_rect(center=thumbRect.center))
+                labelSurf = BASICFONT.render('Level %s' % (i + 1), 1, TEXTCOLOR)
+                DISPLAYSURF.blit(labelSurf, labelSurf.get_rect(midtop=(thumbRect.centerx, thumbRect.bottom + 4)))
+                if levelKey(levels[i]) in settings.solved_levels: DISPLAYSURF.blit(solvedSurf, solvedSurf.get_rect(topright=thumbRect.topright))
+            pygame.draw.rect(DISPLAYSURF, BGCOLOR, (0, 0, WINWIDTH, gridTop)) # the grid scrolls under the instructions
+            instSurf = BASICFONT.render('Arrow keys, mouse wheel or click to choose a level, Enter or click again to play, Esc to go back.', 1, TEXTCOLOR)
+            DISPLAYSURF.blit(instSurf, instSurf.get_rect(midtop=(HALF_WINWIDTH, 20)))
+
+            pygame.display.update()
+            FPSCLOCK.tick(MAX_FPS)
+    finally:
+        for future in loading.values(): future.cancel()
+        executor.shutdown(wait=False)
 
 def readLevelsFile(filename):
     assert os.path.exists(filename), 'Cannot find the level file: %s' % (filename)
-    mapFile = open(filename, 'r')
-    # Each level must end with a blank line
-    content = mapFile.readlines() + ['\r\n']
-    mapFile.close()
-
     levels = [] # Will contain a list of level objects.
-    levelNum = 0
-    mapTextLines = [] # contains the lines for a single level's map.
-    mapObj = [] # the map object made from the data in mapTextLines
-    for lineNum in range(len(content)):
-        # Process each line that was in the level file.
-        line = content[lineNum].rstrip('\r\n')
-
-        if ';' in line:
-            # Ignore the ; lines, they're comments in the level file.
-            line = line[:line.find(';')]
-
-        if line != '':
-            # This line is part of the map.
-            mapTextLines.append(line)
-        elif line == '' and len(mapTextLines) > 0:
-            # A blank line indicates the end of a level's map in the file.
-            # Convert the text in mapTextLines into a level object.
-
-            # Find the longest row in the map.
-            maxWidth = -1
-            for i in range(len(mapTextLines)):
-                if len(mapTextLines[i]) > maxWidth:
-                    maxWidth = len(mapTextLines[i])
-            # Add spaces to the ends of the shorter rows. This
-            # ensures the map will be rectangular.
-            for i in range(len(mapTextLines)):
-                mapTextLines[i] += ' ' * (maxWidth - len(mapTextLines[i]))
-
-            # Convert mapTextLines to a map object.
-            for x in range(len(mapTextLines[0])):
-                mapObj.append([])
-            for y in range(len(mapTextLines)):
-                for x in range(maxWidth):
-                    mapObj[x].append(mapTextLines[y][x])
-
-            # Loop through the spaces in the map and find the @, ., and $
-            # characters for the starting game state.
-            startx = None # The x and y for the player's starting position
-            starty = None
-            goals = [] # list of (x, y) tuples for each goal.
-            stars = [] # list of (x, y) for each star's starting position.
-            for x in range(maxWidth):
-                for y in range(len(mapObj[x])):
-                    if mapObj[x][y] in ('@', '+'):
-                        # '@' is player, '+' is player & goal
-                        startx = x
-                        starty = y
-                    if mapObj[x][y] in ('.', '+', '*'):
-                        # '.' is goal, '*' is star & goal
-                        goals.append((x, y))
-                    if mapObj[x][y] in ('$', '*'):
-                        # '$' is star
-                        stars.append((x, y))
-
-            # Basic level design sanity checks:
+    with open(filename, 'r') as mapFile:
+        for levelNum, (lineNum, rows) in enumerate(levelfile.iterLevelRows(mapFile)):
+            # Convert the map lines into a level object.
+            levelObj = levelfile.makeLevelObj(rows)
+            startx, starty = levelObj['startState']['player']
+            goals = levelObj['goals']
+            stars = levelObj['startState']['stars']
+
+            # Basic level design sanity checks (levelcheck.py checks a lot more):
             assert startx != None and starty != None, 'Level %s (around line %s) in %s is missing a "@" or "+" to mark the start point.' % (levelNum+1, lineNum, filename)
             assert len(goals) > 0, 'Level %s (around line %s) in %s must have at least one goal.' % (levelNum+1, lineNum, filename)
             assert len(stars) >= len(goals), 'Level %s (around line %s) in %s is impossible to solve. It has %s goals but only %s stars.' % (levelNum+1, lineNum, filename, len(goals), len(stars))
 
-            # Create level object and starting game state object.
-            gameStateObj = {'player': (startx, starty),
-                            'stepCounter': 0,
-                            'stars': stars, GameStateItem.SELECTED_STAR_INDEX.name: None}
-            levelObj = {'width': maxWidth,
-                        'height': len(mapObj),
-                        'mapObj': mapObj,
-                        'goals': goals,
-                        'startState': gameStateObj}
-
             levels.append(levelObj)
-
-            # Reset the variables for reading the next map.
-            mapTextLines = []
-            mapObj = []
-            gameStateObj = {}
-            levelNum += 1
     return levels
 
 
-def floodFill(mapObj, x, y, oldCharacter, newCharacter):
-    """Changes any values matching oldCharacter on the map object to
-    newCharacter at the (x, y) position, and does the same for the
-    positions to the left, right, down, and up of (x, y), recursively."""
-
-    # In this game, the flood fill algorithm creates the inside/outside
-    # floor distinction. This is a "recursive" function.
-    # For more info on the Flood Fill algorithm, see:
-    #   http://en.wikipedia.org/wiki/Flood_fill
-    if mapObj[x][y] == oldCharacter:
-        mapObj[x][y] = newCharacter
-
-    if x < len(mapObj) - 1 and mapObj[x+1][y] == oldCharacter:
-        floodFill(mapObj, x+1, y, oldCharacter, newCharacter) # call right
-    if x > 0 and mapObj[x-1][y] == oldCharacter:
-        floodFill(mapObj, x-1, y, oldCharacter, newCharacter) # call left
-    if y < len(mapObj[x]) - 1 and mapObj[x][y+1] == oldCharacter:
-        floodFill(mapObj, x, y+1, oldCharacter, newCharacter) # call down
-    if y > 0 and mapObj[x][y-1] == oldCharacter:
-        floodFill(mapObj, x, y-1, oldCharacter, newCharacter) # call up
-
-
-def drawMap(mapObj, gameStateObj, goals):
-    """Draws the map to a Surface object, including the player and stars. This function does not call pygame.display.update(), nor does it draw the "Level" and "Steps" text in the corner."""
+def drawMap(mapObj, gameStateObj, goals, hintTarget=None, pushTargets=()):
+    """Draws the map to a Surface object, including the player and stars. This function does not call pygame.display.update(), nor does it draw the "Level" and "Steps" text in the corner.
+    hintTarget is the position a hint wants the selected star to be pushed to,
+    pushTargets the positions the selected star can be pushed to (highlighted)."""
 
     # mapSurf will be the single Surface object that the tiles are drawn
     # on, so that it is easy to position the entire map on the DISPLAYSURF
@@ -758,8 +786,8 @@ def drawMap(mapObj, gameStateObj, goals):
     mapSurf.fill(BGCOLOR) # start with a blank color on the surface.
 
     selectedStar = None
-    if gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name] != None:
-        selectedStar = gameStateObj['stars'][gameStateObj[GameStateItem.SELECTED_STAR_INDEX.name]]
+    if gameStateObj[SELECTED_STAR] != None:
+        selectedStar = gameStateObj['stars'][gameStateObj[SELECTED_STAR]]
 
     # Draw the tile sprites onto this surface.
     for x in range(len(mapObj)):
@@ -771,6 +799,7 @@ def drawMap(mapObj, gameStateObj, goals):
                 baseTile = TILEMAPPING[' ']
 
             # First draw the base ground/wall tile.
+            if (x, y) in pushTargets: baseTile = IMAGESDICT['push target']
             mapSurf.blit(baseTile, spaceRect)
 
             if mapObj[x][y] in OUTSIDEDECOMAPPING:
@@ -788,6 +817,9 @@ def drawMap(mapObj, gameStateObj, goals):
                 # Draw a goal without a star on it.
                 mapSurf.blit(IMAGESDICT['uncovered goal'], spaceRect)
 
+            if (x, y) == hintTarget:
+                mapSurf.blit(IMAGESDICT['star hint'], spaceRect)
+
             # Last draw the player on the board.
             if (x, y) == gameStateObj['player']:
                 # Note: The value "currentImage" refers
@@ -797,12 +829,6 @@ def drawMap(mapObj, gameStateObj, goals):
 
     return mapSurf
 
-def isLevelFinished(levelObj, gameStateObj):
-    """Returns True if all the goals have stars in them."""
-    for goal in levelObj['goals']:
-        if goal not in gameStateObj['stars']: return False # Found a space with a goal but no star on it.
-    return True
-
 def terminate():
     settings.save()
     try:
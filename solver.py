@@ -0,0 +1,543 @@
+"""
+Sokoban search used by the hint engine of Star Pusher.
+
+All functions work on a map object as used by runLevel(): a list of columns,
+mapObj[x][y], where '#' and 'x' are walls. Positions are (x, y) tuples, just
+like gameStateObj['player'] and gameStateObj['stars'].
+"""
+
+import heapq, threading, time
+from collections import deque
+
+DIRECTIONS = ((0, -1), (1, 0), (0, 1), (-1, 0)) # up, right, down, left
+WALLS = ('#', 'x')
+MAX_HINT_STATES = 100000 # a hint search gives up after expanding this many states, asking again gives it as many more
+HINT_WEIGHT = 3 # hints don't need the shortest solution, just a quick one
+STOP_CHECK_STATES = 256 # solve() calls shouldStop() once per this many expanded states
+ROOM_PLAN_STATES = 50000 # give up planning how to fill a room after expanding this many states...
+ROOM_SOLVE_STATES = 5000 # ...or solving a room that has all its stars already
+ROOM_FOCUS = 10 # see solveRooms()
+
+def insideFloor(mapObj, startxy):
+    """Returns the set of (x, y) positions the player can reach from startxy
+    when only walls block the way (stars are ignored)."""
+    width, height = len(mapObj), len(mapObj[0]) # map objects are rectangular
+    floor = set([startxy])
+    q = deque([startxy])
+    while q:
+        x, y = q.popleft()
+        for cell in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            if cell not in floor and 0 <= cell[0] < width and 0 <= cell[1] < height and mapObj[cell[0]][cell[1]] not in WALLS:
+                floor.add(cell)
+                q.append(cell)
+    return floor
+
+def goalDistances(floor, goals):
+    """Returns a dict with for every floor position the minimum number of
+    pushes needed to move a star from there to the nearest goal, ignoring the
+    other stars. Positions missing from the dict are dead squares: a star
+    pushed there can never reach a goal again."""
+    distances = {}
+    q = deque()
+    for goal in goals:
+        distances[goal] = 0 # also for a star already on a walled in goal
+        if goal in floor: q.append(goal)
+    while q: # pull stars backwards from the goals
+        x, y = q.popleft()
+        for dx, dy in DIRECTIONS:
+            star = (x + dx, y + dy) # the star is pulled to here...
+            player = (x + 2 * dx, y + 2 * dy) # ...by the player walking to here
+            if star in floor and player in floor and star not in distances:
+                distances[star] = distances[(x, y)] + 1
+                q.append(star)
+    return distances
+
+def playerReach(floor, stars, player):
+    """Returns tuple (set of reachable positions, normalized player position).
+    The normalized position is the smallest reachable position, so every
+    player position within the same area gives the same state."""
+    reach = set([player])
+    q = deque([player])
+    while q:
+        x, y = q.popleft()
+        for dx, dy in DIRECTIONS:
+            cell = (x + dx, y + dy)
+            if cell in floor and cell not in stars and cell not in reach:
+                reach.add(cell)
+                q.append(cell)
+    return reach, min(reach)
+
+def stateKey(floor, player, stars):
+    """Returns a hashable key for a game state, the same for all player
+    positions that can walk to each other without pushing a star."""
+    stars = tuple(sorted(stars))
+    return (playerReach(floor, set(stars), player)[1], stars)
+
+def isFrozen(floor, goals, stars, star):
+    """Returns True if star is part of a 2x2 block of walls and stars that
+    contains a star not on a goal. None of these stars can ever move again.
+    Always False with more stars than goals, some stars may stay anywhere."""
+    if len(stars) > len(goals): return False
+    x, y = star
+    for dx, dy in ((-1, -1), (-1, 0), (0, -1), (0, 0)):
+        block = [(x + dx + i, y + dy + j) for i in (0, 1) for j in (0, 1)]
+        if all(cell not in floor or cell in stars for cell in block) and \
+           any(cell in stars and cell not in goals for cell in block):
+            return True
+    return False
+
+def heuristic(distances, stars, goalCount):
+    """Returns a lower bound of the pushes still needed, or None if too many
+    stars are on dead squares to cover all goals."""
+    live = sorted(distances[star] for star in stars if star in distances)
+    if len(live) < goalCount: return None
+    return sum(live[:goalCount])
+
+def isDeadlock(floor, goals, dead, stars, star):
+    """Returns True if star, just pushed, is frozen together with a star that
+    is not on a goal. A star is frozen when it can't move along either axis:
+    there is a wall on one side, dead squares on both sides, or a frozen star
+    on one side. dead is the set of dead squares, see goalDistances()."""
+    group = set()
+    return _isStuck(floor, dead, stars, star, set([star]), group) and any(cell not in goals for cell in group)
+
+def _isStuck(floor, dead, stars, star, seen, group):
+    """Helper of isDeadlock(), adds the frozen stars to group. Stars in seen
+    count as walls, so stars blocking each other are frozen too."""
+    x, y = star
+    for dx, dy in ((1, 0), (0, 1)):
+        before, after = (x - dx, y - dy), (x + dx, y + dy)
+        if before not in floor or after not in floor or before in seen or after in seen: continue
+        if before in dead and after in dead: continue
+        if any(cell in stars and _isStuck(floor, dead, stars, cell, seen | set([cell]), group) for cell in (before, after)): continue
+        return False
+    group.add(star)
+    return True
+
+def corralPushes(floor, goals, distances, stars, reach):
+    """Looks for a corral: an area the player can't reach, fenced in by stars
+    that can only be pushed into it, by a player who can reach them. Such a
+    corral has to be opened some time, and opening it first loses nothing.
+    Returns None if there is no corral that needs opening, otherwise the
+    pushes into the corral with the fewest of them. An empty list means a
+    corral can never be opened, the level is unsolvable from here."""
+    seen = set()
+    best = None
+    for cell in floor:
+        if cell in reach or cell in stars or cell in seen: continue
+        area = set([cell])
+        q = deque([cell])
+        while q:
+            x, y = q.popleft()
+            for dx, dy in DIRECTIONS:
+                neighbour = (x + dx, y + dy)
+                if neighbour in floor and neighbour not in stars and neighbour not in reach and neighbour not in area:
+                    area.add(neighbour)
+                    q.append(neighbour)
+        seen |= area
+        fence = set((x + dx, y + dy) for x, y in area for dx, dy in DIRECTIONS if (x + dx, y + dy) in stars)
+        if all(star in goals for star in fence) and not (area & goals): continue # nothing to do in there
+        pushes = []
+        for x, y in fence:
+            for dx, dy in DIRECTIONS:
+                standing, target = (x - dx, y - dy), (x + dx, y + dy)
+                if standing not in floor or standing in area or standing in fence: continue
+                if target not in distances or target in fence: continue # a push that can't be made
+                if target not in area or standing not in reach: break # the corral can also be left alone
+                pushes.append(((x, y), target))
+            else: continue
+            break
+        else:
+            if best is None or len(pushes) < len(best): best = pushes
+            if not best: return best
+    return best
+
+def solve(floor, goals, player, stars, maxStates=MAX_HINT_STATES, shouldStop=None, distances=None, weight=1, exitCell=None, goalKeys=None):
+    """A* search over pushes. With weight 1 the solution has the least number
+    of pushes, a higher weight finds a (longer) solution faster.
+    Returns tuple (list of pushes, number of expanded states). Each push is a
+    tuple (star position, new star position). The list is None if no solution
+    was found: the level is unsolvable from here, maxStates (None for no
+    limit) was reached, or shouldStop() returned True.
+    With exitCell, the player must be able to walk to it at the end. A state
+    whose stateKey() is in goalKeys counts as solved too, the pushes then end
+    there."""
+    if distances is None: distances = goalDistances(floor, goals)
+    dead = set(cell for cell in floor if cell not in distances)
+    goals = set(goals)
+    stars = tuple(sorted(stars))
+    # With more stars than goals a star may stay on a dead square or frozen
+    # off a goal, then only heuristic() can tell that too many of them are.
+    pruning = len(stars) <= len(goals)
+    h = heuristic(distances, stars, len(goals))
+    if h is None: return None, 0
+    counter = 0 # tie breaker so heapq never compares the states themselves, newest first
+    openList = [(h, counter, 0, player, stars, None, None)]
+    parents = {} # state key -> (parent state key, push)
+    expanded = 0
+    while openList:
+        _, _, cost, player, stars, parentKey, push = heapq.heappop(openList)
+        starSet = set(stars)
+        reach, normalized = playerReach(floor, starSet, player)
+        key = (normalized, stars)
+        if key in parents: continue # reached before with less pushes
+        parents[key] = (parentKey, push)
+        if (goals <= starSet and (exitCell is None or exitCell in reach)) or (goalKeys is not None and key in goalKeys):
+            return _pushesTo(parents, key), expanded
+        expanded += 1
+        if maxStates is not None and expanded >= maxStates: break
+        if shouldStop is not None and expanded % STOP_CHECK_STATES == 0 and shouldStop(): break
+        corral = corralPushes(floor, goals, distances, starSet, reach) if pruning else None
+        if corral is not None: moves = corral
+        else: moves = [((x, y), (x + dx, y + dy)) for x, y in stars for dx, dy in DIRECTIONS]
+        for (x, y), target in moves:
+            if (2 * x - target[0], 2 * y - target[1]) not in reach or target not in floor or target in starSet: continue
+            newStars = tuple(sorted(target if star == (x, y) else star for star in stars))
+            if pruning and (target not in distances or isDeadlock(floor, goals, dead, newStars, target)): continue
+            h = heuristic(distances, newStars, len(goals))
+            if h is None: continue
+            counter -= 1
+            heapq.heappush(openList, (cost + 1 + weight * h, counter, cost + 1, (x, y), newStars, key, ((x, y), target)))
+    return None, expanded
+
+def _pushesTo(parents, key):
+    """Returns the list of pushes (or lists of pushes) that led to state key,
+    walking back the parents dict of a search."""
+    pushes = []
+    parentKey, push = parents[key]
+    while push is not None:
+        pushes.append(push)
+        parentKey, push = parents[parentKey]
+    pushes.reverse()
+    return pushes
+
+def findRooms(floor, goals, stars):
+    """Returns a list of tuples (entrance, set of room positions) for the
+    rooms of a level: parts of the floor with goals that can only be entered
+    through one floor position, the entrance, and that don't have more stars
+    than goals. Rooms inside other rooms are left out."""
+    goals, stars = set(goals), set(stars)
+    rooms = []
+    for entrance in floor:
+        if entrance in goals or entrance in stars: continue
+        parts = []
+        todo = floor - set([entrance])
+        while todo:
+            part, _ = playerReach(todo, set(), todo.pop())
+            todo -= part
+            parts.append(part)
+        parts.sort(key=len)
+        for part in parts[:-1]: # the biggest part is the outside
+            goalCount = len(part & goals)
+            if goalCount and len(part & stars) <= goalCount: rooms.append((entrance, part))
+    rooms.sort(key=lambda room: -len(room[1]))
+    kept = []
+    for entrance, room in rooms:
+        if not any(room <= other or entrance in other for _, other in kept): kept.append((entrance, room))
+    return kept
+
+def planRoom(floor, entrance, room, goals, stars, player, maxStates=ROOM_PLAN_STATES, shouldStop=None):
+    """Plans how to fill a room (see findRooms()) by searching backwards: from
+    a star on every goal of the room, stars are pulled around and out through
+    the entrance until the room has the stars it has now. Returns the plan as
+    a list of steps in playing order, or None if none was found. A step is
+    tuple ('pushes', list of pushes) for pushes inside the room, or tuple
+    ('deliver', (star position, entrance)) for a star pushed into the room."""
+    roomGoals = frozenset(goal for goal in goals if goal in room)
+    now = frozenset(star for star in stars if star in room)
+    starCells = room | set([entrance])
+    playerCells = set(starCells)
+    outside = [] # the floor next to the entrance, stars are delivered from there
+    exits = {} # outside position -> where the player stands to deliver a star from there
+    for dx, dy in DIRECTIONS:
+        cell = (entrance[0] + dx, entrance[1] + dy)
+        if cell in floor and cell not in room:
+            outside.append(cell)
+            playerCells.add(cell)
+            if (cell[0] + dx, cell[1] + dy) in floor:
+                exits[cell] = (cell[0] + dx, cell[1] + dy)
+                playerCells.add(exits[cell])
+    # Pulls needed to bring a star back to a star position of now or out of the entrance.
+    distances = dict((cell, 0) for cell in list(now) + [entrance])
+    q = deque(distances)
+    while q:
+        x, y = q.popleft()
+        for dx, dy in DIRECTIONS:
+            star = (x - dx, y - dy)
+            if star in starCells and (x + dx, y + dy) in playerCells and star not in distances:
+                distances[star] = distances[(x, y)] + 1
+                q.append(star)
+    def h(stars):
+        if any(star not in distances for star in stars): return None
+        return sum(distances[star] for star in stars)
+    h0 = h(roomGoals)
+    if h0 is None: return None
+    counter = 0
+    openList = []
+    for cell in outside: # the player comes from outside, into a full room
+        if cell not in roomGoals:
+            counter -= 1
+            openList.append((HINT_WEIGHT * h0, counter, 0, cell, roomGoals, None, None))
+    heapq.heapify(openList)
+    parents = {}
+    expanded = 0
+    while openList:
+        _, _, cost, pulledFrom, roomStars, parentKey, move = heapq.heappop(openList)
+        reach, normalized = playerReach(playerCells, roomStars, pulledFrom)
+        key = (normalized, roomStars)
+        if key in parents: continue
+        parents[key] = (parentKey, move)
+        if roomStars == now and (player in reach or any(cell in reach for cell in outside)):
+            steps = [] # the moves backwards are the steps forwards
+            for kind, push in reversed(_pushesTo(parents, key)):
+                if kind == 'deliver': steps.append(('deliver', push))
+                elif steps and steps[-1][0] == 'pushes': steps[-1][1].append(push)
+                else: steps.append(('pushes', [push]))
+            return steps
+        expanded += 1
+        if expanded >= maxStates: break
+        if shouldStop is not None and expanded % STOP_CHECK_STATES == 0 and shouldStop(): break
+        for star in roomStars:
+            for dx, dy in DIRECTIONS:
+                standing = (star[0] + dx, star[1] + dy) # the star is pulled to here...
+                walkTo = (standing[0] + dx, standing[1] + dy) # ...by the player walking to here
+                if standing not in reach or walkTo not in playerCells or walkTo in roomStars: continue
+                if star == entrance and standing in exits:
+                    if exits[standing] != walkTo: continue
+                    newStars = roomStars - set([star]) # out of the room: delivered from standing
+                    move = ('deliver', (standing, star))
+                elif standing in starCells:
+                    newStars = (roomStars - set([star])) | set([standing])
+                    move = ('push', (standing, star))
+                else: continue
+                newH = h(newStars)
+                if newH is None: continue
+                counter -= 1
+                heapq.heappush(openList, (cost + 1 + HINT_WEIGHT * newH, counter, cost + 1, walkTo, frozenset(newStars), key, move))
+    return None
+
+def roomPlans(floor, goals, player, stars, shouldStop=None):
+    """Returns a list of tuples (entrance, room, steps) with a plan for every
+    room of the level that one was found for, see findRooms() and planRoom().
+    A room with as many stars as goals is solved on its own, leaving the
+    player free to walk out."""
+    plans = []
+    for entrance, room in findRooms(floor, goals, stars):
+        roomGoals = [goal for goal in goals if goal in room]
+        roomStars = [star for star in stars if star in room]
+        if len(roomStars) == len(roomGoals):
+            roomFloor = room | set([entrance]) | set((entrance[0] + dx, entrance[1] + dy) for dx, dy in DIRECTIONS) & (floor - set(stars))
+            pushes, _ = solve(roomFloor, roomGoals, player if player in room else entrance, roomStars,
+                              ROOM_SOLVE_STATES, shouldStop, weight=HINT_WEIGHT, exitCell=entrance)
+            steps = None if pushes is None else [('pushes', pushes)] if pushes else []
+        else: steps = planRoom(floor, entrance, room, goals, stars, player, shouldStop=shouldStop)
+        if steps is not None: plans.append((entrance, room, steps))
+    return plans
+
+def playPushes(floor, stars, player, pushes):
+    """Returns tuple (set of stars, player) after making pushes, or None if
+    one of them can't be made."""
+    stars = set(stars)
+    for star, target in pushes:
+        if star not in stars or target in stars or target not in floor: return None
+        if (2 * star[0] - target[0], 2 * star[1] - target[1]) not in playerReach(floor, stars, player)[0]: return None
+        stars.remove(star)
+        stars.add(target)
+        player = star
+    return stars, player
+
+def solveRooms(floor, goals, player, stars, plans, maxStates=MAX_HINT_STATES, shouldStop=None, weight=1, goalKeys=None):
+    """Like solve(), but the rooms of plans (see roomPlans()) are filled by
+    following their plans, one step at a time, so the search only has to
+    move the stars outside the rooms. A star delivered into a room comes
+    with the pushes after it, so it never blocks the entrance. The list of
+    pushes is also None if the level can't be solved with these plans."""
+    roomCells = set()
+    for entrance, room, steps in plans: roomCells |= room
+    entrances = set(entrance for entrance, room, steps in plans)
+    outside = floor - roomCells
+    outGoals = [goal for goal in goals if goal not in roomCells]
+    goalSet = set(outGoals)
+    deliveries = [[sum(1 for kind, value in steps[i:] if kind == 'deliver') for i in range(len(steps) + 1)] for entrance, room, steps in plans]
+    distances = goalDistances(outside, outGoals + [entrance for (entrance, room, steps), counts in zip(plans, deliveries) if counts[0]])
+    dead = set(cell for cell in outside if cell not in distances)
+    pruning = len(stars) <= len(goals) # see solve()
+    def roomHeuristic(stars, progress):
+        # Stars go into a room one after the other. With only rooms left to
+        # fill, counting just the nearest star (and ROOM_FOCUS for every star
+        # still to deliver) keeps the search on one delivery at a time.
+        remaining = sum(counts[i] for counts, i in zip(deliveries, progress))
+        live = sorted(distances[star] for star in stars if star not in roomCells and star in distances)
+        if len(live) < len(outGoals) + remaining: return None
+        if remaining and not outGoals: return ROOM_FOCUS * remaining + live[0]
+        return sum(live[:len(outGoals) + remaining])
+    stars = tuple(sorted(stars))
+    progress = tuple(0 for plan in plans) # the next step of every plan
+    h = roomHeuristic(stars, progress)
+    if h is None: return None, 0
+    counter = 0
+    openList = [(h, counter, 0, player, stars, progress, None, None)]
+    parents = {} # state key -> (parent state key, list of pushes)
+    expanded = 0
+    while openList:
+        _, _, cost, player, stars, progress, parentKey, pushes = heapq.heappop(openList)
+        starSet = set(stars)
+        reach, normalized = playerReach(floor, starSet, player)
+        key = (normalized, stars)
+        if key in parents: continue
+        parents[key] = (parentKey, pushes)
+        if (goalSet <= starSet and all(i == len(steps) for (entrance, room, steps), i in zip(plans, progress))) \
+            or (goalKeys is not None and key in goalKeys):
+            return [push for pushes in _pushesTo(parents, key) for push in pushes], expanded
+        expanded += 1
+        if maxStates is not None and expanded >= maxStates: break
+        if shouldStop is not None and expanded % STOP_CHECK_STATES == 0 and shouldStop(): break
+        children = []
+        corral = corralPushes(outside, goalSet, distances, starSet, reach) if pruning else None
+        if corral is not None: moves = corral
+        else: moves = [((x, y), (x + dx, y + dy)) for x, y in stars if (x, y) not in roomCells for dx, dy in DIRECTIONS]
+        for (x, y), target in moves:
+            if (2 * x - target[0], 2 * y - target[1]) not in reach or target not in outside or target in starSet or target in entrances: continue
+            newStars = set(starSet)
+            newStars.remove((x, y))
+            newStars.add(target)
+            if pruning and (target not in distances or isDeadlock(outside, goalSet, dead, newStars, target)): continue
+            children.append(((x, y), newStars, progress, [((x, y), target)]))
+        if corral is None: # the next step of a room plan
+            for r, (entrance, room, steps) in enumerate(plans):
+                i = progress[r]
+                if i == len(steps): continue
+                kind, value = steps[i]
+                macro = list(value) if kind == 'pushes' else [value]
+                if kind == 'deliver' and i + 1 < len(steps) and steps[i + 1][0] == 'pushes':
+                    i += 1
+                    macro += steps[i][1]
+                done = playPushes(floor, starSet, player, macro)
+                if done is not None: children.append((done[1], done[0], progress[:r] + (i + 1,) + progress[r + 1:], macro))
+        for newPlayer, newStars, newProgress, macro in children:
+            newStars = tuple(sorted(newStars))
+            h = roomHeuristic(newStars, newProgress)
+            if h is None: continue
+            counter -= 1
+            heapq.heappush(openList, (cost + len(macro) + weight * h, counter, cost + len(macro), newPlayer, newStars, newProgress, key, macro))
+    return None, expanded
+
+
+class HintEngine:
+    """Searches for a solution in a background thread, starting when the level
+    is loaded and searching again as the player moves. Every state on a found
+    solution is remembered, so as long as the player follows a known solution
+    hints are answered instantly, and a search from anywhere else ends as soon
+    as it reaches a known state. Rooms that are filled
+    through one entrance are planned on their own first, see roomPlans().
+    A search that expanded maxStates states gives up, but keeps its work:
+    asking for a hint from the same state again searches maxStates more."""
+    def __init__(self, mapObj, goals, gameStateObj, maxStates=MAX_HINT_STATES):
+        self.floor = insideFloor(mapObj, gameStateObj['player'])
+        self.goals = list(goals)
+        self.distances = goalDistances(self.floor, self.goals)
+        self.maxStates = maxStates
+        self.known = {} # state key -> next push on a known solution
+        self.failed = set() # state keys from which the level can't be solved
+        self.lastState = None # (player, stars) -> key cache, stateKey() is called every frame
+        self.pending = None # state the worker should search from next
+        self.searching = None # state key the worker is searching from now
+        self.budget = 0 # states the search may still expand before giving up
+        self.gaveUp = False # the search ran out of budget and waits for more
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.update(gameStateObj)
+
+    def key(self, gameStateObj):
+        """Returns the state key of gameStateObj, cached for the last state."""
+        state = (gameStateObj['player'], tuple(gameStateObj['stars']))
+        if self.lastState is None or self.lastState[0] != state:
+            self.lastState = (state, stateKey(self.floor, state[0], state[1]))
+        return self.lastState[1]
+
+    def request(self, gameStateObj):
+        """Asks for a hint for gameStateObj: searches from there, or gives a
+        search that gave up there maxStates more states."""
+        key = self.key(gameStateObj)
+        with self.lock:
+            if key == self.searching and self.gaveUp:
+                self.budget = self.maxStates
+                self.gaveUp = False
+        self.update(gameStateObj)
+
+    def update(self, gameStateObj):
+        """Tells the engine the current state, searching from there if it is
+        not on a known solution. A running search is finished first, its
+        solution may save the new search some work."""
+        key = self.key(gameStateObj)
+        with self.lock:
+            if key in self.known or key in self.failed or key == self.searching: self.pending = None
+            else: self.pending = (key, gameStateObj['player'], tuple(gameStateObj['stars']))
+        self.wakeup.set()
+
+    def hint(self, gameStateObj):
+        """Returns the next push (star position, new star position) for gameStateObj,
+        or None if it is not known (yet)."""
+        return self.known.get(self.key(gameStateObj))
+
+    def hasFailed(self, gameStateObj):
+        """Returns True if the level can't be solved from gameStateObj."""
+        return self.key(gameStateObj) in self.failed
+
+    def hasGivenUp(self, gameStateObj):
+        """Returns True if the search from gameStateObj gave up before finding
+        a solution, request() makes it go on."""
+        return self.gaveUp and self.key(gameStateObj) == self.searching
+
+    def stop(self):
+        """Stops the background search, call this when leaving the level."""
+        self.stopped = True
+        self.wakeup.set()
+
+    def _isStopped(self):
+        time.sleep(0) # give the game loop a chance to run
+        return self.stopped
+
+    def _shouldStop(self):
+        time.sleep(0) # give the game loop a chance to run
+        self.budget -= STOP_CHECK_STATES
+        while self.budget <= 0 and not self.stopped and self.pending is None:
+            self.gaveUp = True # wait for request() to give more, or for another state to search
+            self.wakeup.wait()
+            self.wakeup.clear()
+        return self.stopped or self.budget <= 0
+
+    def _run(self):
+        while not self.stopped:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                if self.pending is None: continue
+                key, player, stars = self.pending
+                self.pending = None
+                self.searching = key
+                self.budget = self.maxStates
+                self.gaveUp = False
+            plans = roomPlans(self.floor, self.goals, player, stars, self._isStopped) # for the stars the rooms have now
+            pushes = None
+            if plans and not self.stopped:
+                pushes, _ = solveRooms(self.floor, self.goals, player, stars, plans, None, self._shouldStop, HINT_WEIGHT, self.known)
+            if pushes is None and not self.stopped and self.budget > 0: # no rooms, or their plans didn't work out
+                pushes, _ = solve(self.floor, self.goals, player, stars, None, self._shouldStop, self.distances, HINT_WEIGHT, goalKeys=self.known)
+            with self.lock:
+                if pushes is not None: self._remember(player, stars, pushes)
+                elif not self.stopped and self.budget > 0: self.failed.add(key) # searched everything
+                self.searching = None
+                self.gaveUp = False
+                if self.pending is not None: self.wakeup.set()
+
+    def _remember(self, player, stars, pushes):
+        """Stores the next push for every state along a solution."""
+        stars = list(stars)
+        for push in pushes:
+            self.known[stateKey(self.floor, player, stars)] = push
+            stars[stars.index(push[0])] = push[1]
+            player = push[0]
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Memory-bounded state storage for searching big levels.
+
+A search that keeps every visited state as a tuple in a Python dict runs out
+of memory on big levels. Here a state is packed into a few bytes:
+    * the player's area, as the index of its smallest floor position,
+    * a bitset with one bit per floor position that holds a star.
+Visited states go into an open addressing hash table in an mmap of a fixed
+size. If the table fits in the memory limit it is in memory, otherwise it is a
+file on disk of which only the memory limit's worth of pages is kept in RAM.
+The states themselves are appended to a log file, which is read back in order
+as the queue of a breadth first search. --memory-mb is the budget for the
+whole process, the peak memory is reported next to it.
+
+    python3 statestore.py starPusherLevels.txt --level 3 --memory-mb 512 --table-mb 4096 --dir /tmp
+"""
+
+import argparse, mmap, os, struct, sys, tempfile, time
+import levelfile, solver, sysresources
+
+MAX_LOAD = 0.75 # the visited table is full when this part of its slots is used, probing gets slow after that
+# The kernel maps up to 64 KB of pages around the one that was used (fault-around),
+# so the table's file is kept track of and dropped from memory in blocks of that size.
+PAGE_BLOCK = max(mmap.PAGESIZE, 64 * 1024)
+SEARCH_MEMORY = 8 * 1024 * 1024 # bytes of the memory budget kept for the search itself, the rest is for the table
+
+class StateEncoder:
+    """Packs (player area, stars) states of one level into fixed size bytes."""
+    def __init__(self, floor):
+        self.cells = sorted(floor) # bit number -> (x, y)
+        self.index = dict((cell, i) for i, cell in enumerate(self.cells)) # (x, y) -> bit number
+        self.cellBytes = 2 if len(self.cells) < 65536 else 4
+        self.bitsetBytes = (len(self.cells) + 7) // 8
+        self.size = self.cellBytes + self.bitsetBytes
+
+    def encode(self, area, stars):
+        """Returns the bytes for a state, area is the normalized player position of solver.playerReach()."""
+        bits = 0
+        for star in stars: bits |= 1 << self.index[star]
+        return self.index[area].to_bytes(self.cellBytes, 'little') + bits.to_bytes(self.bitsetBytes, 'little')
+
+    def decode(self, key):
+        """Returns tuple (player area position, list of star positions) for bytes made by encode()."""
+        area = self.cells[int.from_bytes(key[:self.cellBytes], 'little')]
+        bits = int.from_bytes(key[self.cellBytes:], 'little')
+        stars = []
+        i = 0
+        while bits:
+            if bits & 1: stars.append(self.cells[i])
+            bits >>= 1
+            i += 1
+        return area, stars
+
+
+class TableFull(Exception):
+    """The VisitedTable has no room for more keys."""
+
+class VisitedTable:
+    """Open addressing hash table (linear probing) from fixed size keys to
+    record numbers, in an mmap of tableBytes that never grows. A table bigger
+    than memoryLimit bytes is put in a file in directory instead of in memory,
+    and the pages it touched are dropped from memory again whenever they add
+    up to memoryLimit, so it never holds more RAM than that."""
+    def __init__(self, keySize, tableBytes, memoryLimit, directory=None):
+        self.keySize = keySize
+        self.slotSize = keySize + 8 # key, record number + 1 (0 is an empty slot)
+        self.capacity = max(2, tableBytes // self.slotSize)
+        self.memoryLimit = memoryLimit
+        self.count = 0
+        self.touchedBlocks = set() # PAGE_BLOCKs of the file that may be in memory since they were last dropped
+        size = self.capacity * self.slotSize
+        if size <= memoryLimit:
+            self.buffer, self.file = mmap.mmap(-1, size), None # anonymous mmaps start zeroed
+        else:
+            self.file = tempfile.TemporaryFile(dir=directory)
+            self.file.truncate(size)
+            self.buffer = mmap.mmap(self.file.fileno(), size)
+
+    def onDisk(self):
+        """Returns True if the table is in a file."""
+        return self.file is not None
+
+    def bytesUsed(self):
+        return self.capacity * self.slotSize
+
+    def isFull(self):
+        """Returns True if no more keys can be added, see MAX_LOAD."""
+        return self.count + 1 > self.capacity * MAX_LOAD
+
+    def _find(self, key):
+        """Returns tuple (slot, record number), the record number is None if key is not in the table."""
+        first = slot = hash(key) % self.capacity
+        while True:
+            offset = slot * self.slotSize
+            record = int.from_bytes(self.buffer[offset + self.keySize:offset + self.slotSize], 'little')
+            if record == 0:
+                found = None
+                break
+            if self.buffer[offset:offset + self.keySize] == key:
+                found = record - 1
+                break
+            slot = (slot + 1) % self.capacity
+        if self.file is not None:
+            if slot < first: # the probes wrapped around to the start
+                self._touch(first * self.slotSize, self.bytesUsed())
+                self._touch(0, offset + self.slotSize)
+            else: self._touch(first * self.slotSize, offset + self.slotSize)
+        return slot, found
+
+    def _touch(self, start, end):
+        """Notes that bytes start to end of the file were used, and drops the
+        used blocks from memory once they reach the memory limit."""
+        self.touchedBlocks.update(range(start // PAGE_BLOCK, (end - 1) // PAGE_BLOCK + 1))
+        if len(self.touchedBlocks) * PAGE_BLOCK <= self.memoryLimit: return
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            # The changes are kept: the pages of a shared file mapping go back to the file.
+            for block in self.touchedBlocks:
+                self.buffer.madvise(mmap.MADV_DONTNEED, block * PAGE_BLOCK, min(PAGE_BLOCK, self.bytesUsed() - block * PAGE_BLOCK))
+        else: # no madvise() before Python 3.8, mapping the file again drops all of its pages
+            self.buffer.close()
+            self.buffer = mmap.mmap(self.file.fileno(), self.bytesUsed())
+        self.touchedBlocks = set()
+
+    def get(self, key):
+        """Returns the record number stored for key, or None."""
+        return self._find(key)[1]
+
+    def add(self, key, record):
+        """Stores key with its record number. Returns False if key was already
+        there, raises TableFull if there is no room for it."""
+        slot, found = self._find(key)
+        if found is not None: return False
+        if self.isFull(): raise TableFull('the visited table is full with {} states'.format(self.count))
+        offset = slot * self.slotSize
+        self.buffer[offset:offset + self.slotSize] = key + (record + 1).to_bytes(8, 'little')
+        if self.file is not None: self._touch(offset, offset + self.slotSize)
+        self.count += 1
+        return True
+
+    def close(self):
+        self.buffer.close()
+        if self.file is not None: self.file.close()
+
+
+class StateLog:
+    """Append-only file of state records: key, parent record number and the
+    push that led to the state. Records are read back in the order they were
+    added, which is the queue order of a breadth first search."""
+    def __init__(self, keySize, directory=None):
+        self.record = struct.Struct('<%dsQII' % keySize)
+        self.writer = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        self.reader = open(self.writer.name, 'rb')
+        self.count = 0
+        self.readCount = 0
+
+    def append(self, key, parent, pushFrom, pushTo):
+        """Adds a record and returns its number."""
+        self.writer.write(self.record.pack(key, parent, pushFrom, pushTo))
+        self.count += 1
+        return self.count - 1
+
+    def next(self):
+        """Returns the next (record number, key, parent, pushFrom, pushTo) in order, or None at the end."""
+        if self.readCount >= self.count: return None
+        data = self.reader.read(self.record.size)
+        if len(data) < self.record.size: # not written to the file yet
+            self.writer.flush()
+            data += self.reader.read(self.record.size - len(data))
+        self.readCount += 1
+        return (self.readCount - 1,) + self.record.unpack(data)
+
+    def get(self, number):
+        """Returns record number as (key, parent, pushFrom, pushTo)."""
+        self.writer.flush()
+        with open(self.writer.name, 'rb') as f:
+            f.seek(number * self.record.size)
+            return self.record.unpack(f.read(self.record.size))
+
+    def bytesUsed(self):
+        return self.count * self.record.size
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+        os.unlink(self.writer.name)
+
+
+def solveBounded(floor, goals, player, stars, memoryLimit=256 * 1024 * 1024, directory=None, maxStates=None, tableBytes=None):
+    """Breadth first search over pushes with the visited states in a
+    VisitedTable and the queue in a StateLog, so memory stays bounded.
+    memoryLimit is the RAM for the table, which is tableBytes big (default
+    memoryLimit, or just enough for maxStates). Returns tuple (list of pushes
+    or None, statistics dict). The solution has the least number of pushes, a
+    push is (star position, new star position)."""
+    encoder = StateEncoder(floor | set(goals) | set(stars))
+    distances = solver.goalDistances(floor, goals)
+    goalSet = set(goals)
+    if tableBytes is None:
+        tableBytes = memoryLimit if maxStates is None else int(maxStates / MAX_LOAD + 1) * (encoder.size + 8)
+    table = VisitedTable(encoder.size, tableBytes, memoryLimit, directory)
+    log = StateLog(encoder.size, directory)
+    startTime = time.time()
+    pushes = None
+    full = False
+    try:
+        start = encoder.encode(solver.playerReach(floor, set(stars), player)[1], stars)
+        table.add(start, log.append(start, 0, 0, 0))
+        found = None
+        if goalSet <= set(stars): found = 0
+        while found is None and not full and (maxStates is None or log.count < maxStates):
+            entry = log.next()
+            if entry is None: break # every reachable state was tried, unsolvable
+            number, key, _, _, _ = entry
+            area, starList = encoder.decode(key)
+            starSet = set(starList)
+            reach = solver.playerReach(floor, starSet, area)[0]
+            for (x, y) in starList:
+                for dx, dy in solver.DIRECTIONS:
+                    target = (x + dx, y + dy)
+                    if (x - dx, y - dy) not in reach or target not in floor or target in starSet: continue
+                    newStars = starSet - set([(x, y)]) | set([target])
+                    # a surplus star may end on a dead square, heuristic() counts the live ones
+                    if solver.isFrozen(floor, goalSet, newStars, target): continue
+                    if solver.heuristic(distances, newStars, len(goalSet)) is None: continue
+                    newKey = encoder.encode(solver.playerReach(floor, newStars, (x, y))[1], newStars)
+                    if table.get(newKey) is not None: continue
+                    if table.isFull():
+                        full = True
+                        break
+                    record = log.append(newKey, number, encoder.index[(x, y)], encoder.index[target])
+                    table.add(newKey, record)
+                    if goalSet <= newStars:
+                        found = record
+                        break
+                if found is not None or full: break
+        if found is not None: # walk back along the parents to the start
+            pushes = []
+            while found != 0:
+                _, parent, pushFrom, pushTo = log.get(found)
+                pushes.append((encoder.cells[pushFrom], encoder.cells[pushTo]))
+                found = parent
+            pushes.reverse()
+        stats = {'states': log.count,
+                 'seconds': round(time.time() - startTime, 2),
+                 'key bytes': encoder.size,
+                 'table bytes': table.bytesUsed(),
+                 'log bytes': log.bytesUsed(),
+                 'table states': int(table.capacity * MAX_LOAD),
+                 'bytes per state': round(table.slotSize / MAX_LOAD + log.record.size, 1), # the table is made for its states at once
+                 'table on disk': table.onDisk(),
+                 'table full': full}
+        return pushes, stats
+    finally:
+        table.close()
+        log.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve a level with a memory-bounded breadth first search.')
+    parser.add_argument('levels', help='level file')
+    parser.add_argument('--level', type=int, default=1, help='level number, starting at 1')
+    parser.add_argument('--memory-mb', type=int, default=256, help='memory budget of the whole search (default %(default)s)')
+    parser.add_argument('--table-mb', type=int, help='size of the visited table, on disk if it is bigger than the memory budget; '
+                        'default is the memory budget, or just enough for --max-states')
+    parser.add_argument('--dir', help='directory for the files on disk, default is the temp directory')
+    parser.add_argument('--max-states', type=int, help='give up after this many states')
+    args = parser.parse_args()
+
+    with open(args.levels, 'r') as f:
+        for levelNum, (lineNum, rows) in enumerate(levelfile.iterLevelRows(f), 1):
+            if levelNum == args.level: break
+        else: sys.exit('{} has only {} levels'.format(args.levels, levelNum))
+    levelObj = levelfile.makeLevelObj(rows)
+    startState = levelObj['startState']
+    floor = solver.insideFloor(levelObj['mapObj'], startState['player'])
+    # What the program uses before the search is taken from the budget.
+    memoryLimit = args.memory_mb * 1024 * 1024 - (sysresources.peakMemory() or 0) - SEARCH_MEMORY
+    if memoryLimit <= 0:
+        parser.error('--memory-mb must be more than the {} MB the program needs without the table'.format(
+            ((sysresources.peakMemory() or 0) + SEARCH_MEMORY) // (1024 * 1024) + 1))
+    tableBytes = None if args.table_mb is None else args.table_mb * 1024 * 1024
+    pushes, stats = solveBounded(floor, levelObj['goals'], startState['player'], startState['stars'],
+                                 memoryLimit, args.dir, args.max_states, tableBytes)
+    for key in sorted(stats): print('{}: {}'.format(key, stats[key]))
+    print('pushes: {}'.format('no solution found' if pushes is None else len(pushes)))
+    if sysresources.peakMemory() is not None: print('peak memory: {} MB of the {} MB budget'.format(sysresources.peakMemory() // (1024 * 1024), args.memory_mb))
+
+if __name__ == '__main__': main()
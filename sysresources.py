@@ -0,0 +1,22 @@
+"""
+Process resources for the tools: peak memory use and the open files limit.
+The resource module is only on Unix, elsewhere these do nothing.
+"""
+
+import sys
+try: import resource
+except ImportError: resource = None
+
+def peakMemory():
+    """Returns the most memory (RSS) the process used so far in bytes, or None if it can't be known."""
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # bytes on macOS, kilobytes elsewhere
+
+def raiseFileLimit():
+    """Allows as many open files as the system lets us, for servers with a connection per session."""
+    if resource is None: return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError): pass